@@ -31,6 +31,7 @@ from werkzeug.local import LocalProxy
 
 from app import proxy_fix, webauthn_server
 from app.asset_fingerprinter import asset_fingerprinter
+from app.broadcast_areas.catalogue import area_catalogue
 from app.config import configs
 from app.extensions import zendesk_client
 from app.formatters import (
@@ -163,6 +164,7 @@ def create_app(application):
 
     logging.init_app(application)
     webauthn_server.init_app(application)
+    area_catalogue.init_app(application)
 
     login_manager.login_view = "main.sign_in"
     login_manager.login_message_category = "default"
@@ -11,15 +11,19 @@
     }
   };
 
-  let filter = ($searchBox, $searchLabel, $liveRegion, $targets) => () => {
+  let containsQuery = (query) => function() {
+    let content = $('.live-search-relevant', this).text() || $(this).text();
+    return normalize(content).indexOf(query) > -1;
+  };
+
+  let showMatches = ($searchBox, $searchLabel, $liveRegion, $targets, matches) => {
 
     let query = normalize($searchBox.val());
     let results = 0;
 
     $targets.each(function() {
 
-      let content = $('.live-search-relevant', this).text() || $(this).text();
-      let isMatch = normalize(content).indexOf(normalize(query)) > -1;
+      let isMatch = matches.call(this);
 
       if ($(this).has(':checked').length) {
         $(this).show();
@@ -57,6 +61,81 @@
 
   };
 
+  let filter = ($searchBox, $searchLabel, $liveRegion, $targets) => () => {
+
+    showMatches(
+      $searchBox, $searchLabel, $liveRegion, $targets, containsQuery(normalize($searchBox.val()))
+    );
+
+  };
+
+  let getAreaId = (target) => $(target).data('areaId') || $('input', target).val();
+
+  let renderResult = ($template, area) => {
+
+    let $result = $($template.html().trim());
+    let id = 'live-search-result-' + area.id;
+
+    $result.attr('data-area-id', area.id);
+    $('.live-search__result-name', $result).text(area.parent ? area.name + ', ' + area.parent : area.name);
+    $('input', $result).attr({ 'id': id, 'value': area.id });
+    $('label', $result).attr('for', id);
+    $('a', $result).attr('href', (index, href) => href.replace('__area_id__', encodeURIComponent(area.id)));
+
+    return $result;
+
+  };
+
+  // A library too big for one page is searched on the server, so that
+  // areas on other pages can be found. Those areas are added after the
+  // ones on this page, and any which are checked stay there
+  let search = ($searchBox, $searchLabel, $liveRegion, $targets, searchURL, $template) => {
+
+    let $results = $();
+    let lastQuery;
+
+    let showResults = (matches) => showMatches(
+      $searchBox, $searchLabel, $liveRegion, $targets.add($results), matches
+    );
+
+    return () => {
+
+      let query = $searchBox.val().trim();
+
+      // Typing fires both keyup and input
+      if (query === lastQuery) { return; }
+      lastQuery = query;
+
+      $results.not(':has(:checked)').remove();
+      $results = $results.has(':checked');
+
+      if (query === '') {
+        showResults(() => true);
+        return;
+      }
+
+      $.ajax(searchURL, { 'method': 'get', 'data': { 'q': query } }).done(response => {
+
+        // Only the latest search is shown
+        if ($searchBox.val().trim() !== query) { return; }
+
+        let areaIds = new Set(response.areas.map(area => area.id));
+        let idsShowing = new Set($targets.add($results).map(function() { return getAreaId(this); }).get());
+
+        response.areas.filter(area => !idsShowing.has(area.id)).forEach(area => {
+          let $result = renderResult($template, area);
+          $targets.add($results).last().after($result);
+          $results = $results.add($result);
+        });
+
+        showResults(function() { return areaIds.has(getAreaId(this)); });
+
+      });
+
+    };
+
+  };
+
 
   Modules.LiveSearch = function() {
 
@@ -68,11 +147,15 @@
       let $searchLabel = $('label', $component);
       let $liveRegion = $('.live-search__status', $component);
 
-      let filterFunc = filter(
+      let searchURL = $component.data('searchUrl');
+
+      let filterFunc = (searchURL ? search : filter)(
         $searchBox,
         $searchLabel,
         $liveRegion,
-        $($component.data('targets'))
+        $($component.data('targets')),
+        searchURL,
+        $('template.live-search__result')
       );
 
       state = 'loaded';
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+"""
+Compares query latency and memory use of the SQLite R*Tree of electoral
+ward bounds against the pickled rtreelib index it replaced.
+
+rtreelib is no longer one of our dependencies, so to run this you need to
+install it and fetch the last version of the pickle from git:
+
+    pip install rtreelib==0.2.0
+    git show $(git log -1 --format=%H -- rtree.pickle)^:./rtree.pickle > /tmp/rtree.pickle
+    ./benchmark-spatial-index.py /tmp/rtree.pickle
+"""
+
+import argparse
+import json
+import pickle
+import random
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from repo import BroadcastAreasRepository
+
+NUMBER_OF_QUERIES = 1_000
+
+# rtreelib only finds boxes which overlap by more than an edge, so it is
+# queried with a slightly bigger box and the results filtered afterwards
+QUERY_MARGIN = 1e-4
+
+
+def get_search_boxes(repo):
+    # Use the bounds of real wards, so the queries are the same sort of
+    # size as a custom area drawn over a town or village
+    boxes = repo.query("SELECT min_x, min_y, max_x, max_y FROM broadcast_area_bounds WHERE area_id LIKE 'wd25-%'")
+    return random.Random(0).sample(boxes, min(NUMBER_OF_QUERIES, len(boxes)))
+
+
+def max_rss_in_kb():
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss // 1024 if sys.platform == "darwin" else max_rss
+
+
+def round_outwards_to_float32(min_x, min_y, max_x, max_y):
+    # The R*Tree stores bounds as 32 bit floats, rounded outwards, so the
+    # pickled bounds are rounded the same way before they are compared
+    def round_down(value):
+        rounded = np.float32(value)
+        return float(np.nextafter(rounded, np.float32("-inf")) if rounded > value else rounded)
+
+    def round_up(value):
+        rounded = np.float32(value)
+        return float(np.nextafter(rounded, np.float32("inf")) if rounded < value else rounded)
+
+    return round_down(min_x), round_down(min_y), round_up(max_x), round_up(max_y)
+
+
+def overlaps(box, other_box):
+    # Inclusive, like the R*Tree query, so boxes touching at an edge count
+    min_x, min_y, max_x, max_y = box
+    other_min_x, other_min_y, other_max_x, other_max_y = other_box
+    return other_min_x <= max_x and other_max_x >= min_x and other_min_y <= max_y and other_max_y >= min_y
+
+
+def measure_sqlite(search_boxes):
+    rss_before = max_rss_in_kb()
+    start = time.perf_counter()
+    repo = BroadcastAreasRepository()
+    repo.get_area_ids_overlapping_bounds(0, 0, 0, 0)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [
+        sorted(repo.get_area_ids_overlapping_bounds(*box, library_id="wd25-lad25-ctyua25", area_type="wd25"))
+        for box in search_boxes
+    ]
+    query_time = time.perf_counter() - start
+
+    return load_time, query_time, max_rss_in_kb() - rss_before, results
+
+
+def measure_pickle(search_boxes, pickle_path):
+    from rtreelib import Rect
+
+    rss_before = max_rss_in_kb()
+    start = time.perf_counter()
+    rtree_index = pickle.loads(Path(pickle_path).read_bytes())
+    load_time = time.perf_counter() - start
+
+    def query(box):
+        min_x, min_y, max_x, max_y = box
+        candidates = rtree_index.query(
+            Rect(min_x - QUERY_MARGIN, min_y - QUERY_MARGIN, max_x + QUERY_MARGIN, max_y + QUERY_MARGIN)
+        )
+        return sorted(
+            entry.data
+            for entry in candidates
+            if overlaps(
+                box,
+                round_outwards_to_float32(entry.rect.min_x, entry.rect.min_y, entry.rect.max_x, entry.rect.max_y),
+            )
+        )
+
+    start = time.perf_counter()
+    results = [query(box) for box in search_boxes]
+    query_time = time.perf_counter() - start
+
+    return load_time, query_time, max_rss_in_kb() - rss_before, results
+
+
+def run_in_subprocess(index, pickle_path):
+    # Each index is loaded in a fresh process so that one doesn’t inflate
+    # the memory use reported for the other
+    output = subprocess.check_output([sys.executable, __file__, pickle_path, "--index", index])
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pickle_path", help="path to a copy of the old rtree.pickle")
+    parser.add_argument("--index", choices=["sqlite", "pickle"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    search_boxes = get_search_boxes(BroadcastAreasRepository())
+
+    if args.index:
+        if args.index == "sqlite":
+            load_time, query_time, rss, results = measure_sqlite(search_boxes)
+        else:
+            load_time, query_time, rss, results = measure_pickle(search_boxes, args.pickle_path)
+        json.dump(
+            {"load_time": load_time, "query_time": query_time, "rss": rss, "results": results},
+            sys.stdout,
+        )
+        return
+
+    sqlite = run_in_subprocess("sqlite", args.pickle_path)
+    rtreelib = run_in_subprocess("pickle", args.pickle_path)
+
+    for box, expected, actual in zip(search_boxes, rtreelib["results"], sqlite["results"]):
+        assert set(actual) == set(expected), f"Indexes disagree for {box}: {set(actual) ^ set(expected)}"
+
+    print(f"{len(search_boxes):,} queries\n")
+    for name, result in (("SQLite R*Tree", sqlite), ("Pickled rtreelib", rtreelib)):
+        print(
+            f"{name}\n"
+            f"    Load:{result['load_time'] * 1000: >10.1f} ms\n"
+            f"    Query:{result['query_time'] / len(search_boxes) * 1000: >9.3f} ms per query\n"
+            f"    Memory:{result['rss'] / 1024: >8.1f} MB\n"
+        )
+    print("Both indexes found the same wards for every query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+# A rough figure for the memory a decoded point takes up, once it’s been
+# turned into Python lists of floats and a Shapely geometry
+APPROXIMATE_SIZE_OF_POINT_IN_BYTES = 150
+
+
+class PolygonsCache:
+    """
+    A least recently used cache of decoded `Polygons`, shared by every
+    request in a worker process. The areas database can’t change while
+    the app is running, so nothing in here ever goes stale.
+    """
+
+    def __init__(self, max_size_in_bytes):
+        self.max_size_in_bytes = max_size_in_bytes
+        self.size_in_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, load):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+
+        # Decoding happens outside the lock so one slow area doesn’t hold
+        # up every other request. Two threads might both decode the same
+        # area, but they’ll get equivalent results
+        polygons = load()
+        size_in_bytes = polygons.point_count * APPROXIMATE_SIZE_OF_POINT_IN_BYTES
+
+        with self._lock:
+            if key not in self._items and size_in_bytes <= self.max_size_in_bytes:
+                self._items[key] = (polygons, size_in_bytes)
+                self.size_in_bytes += size_in_bytes
+                self._evict()
+
+        return polygons
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size_in_bytes = 0
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "items": len(self._items),
+            "size_in_bytes": self.size_in_bytes,
+        }
+
+    def _evict(self):
+        while self.size_in_bytes > self.max_size_in_bytes:
+            _key, (_polygons, size_in_bytes) = self._items.popitem(last=False)
+            self.size_in_bytes -= size_in_bytes
+            self.evictions += 1
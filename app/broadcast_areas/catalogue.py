@@ -0,0 +1,242 @@
+import heapq
+import sys
+import threading
+from array import array
+from collections import namedtuple
+from math import isnan
+from types import MappingProxyType
+
+from .matcher import TrigramMatcher
+from .repo import BroadcastAreasRepository
+
+# There are millions of postcode areas, and they’re only ever looked up
+# one at a time, so they’re left in the database
+UNCATALOGUED_LIBRARY_IDS = ("postcodes",)
+
+NO_PARENT = -1
+NO_COUNT_OF_PHONES = float("nan")
+
+NUMBER_OF_EXAMPLE_NAMES = 4
+
+FLOOD_WARNING_AREA_ID_PREFIX = "Flood_Warning_Target_Areas-"
+
+LibrarySummary = namedtuple("LibrarySummary", ["count_of_areas", "example_names", "has_children"])
+
+
+class AreaCatalogue:
+    """
+    The metadata (but not the polygons) of every library area, held in
+    memory so that looking up areas, their parents and their children
+    doesn’t need the database. Each attribute is a column, indexed by
+    the position of the area in `_ids`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def init_app(self, app):
+        self.load()
+        app.logger.info(
+            f"Loaded {len(self._ids):,} areas into the area catalogue, "
+            f"using {self.size_in_bytes / 1024 / 1024:.1f} MB of memory"
+        )
+
+    def load(self):
+        if self._loaded:
+            return
+
+        with self._lock:
+            if self._loaded:
+                return
+
+            repo = BroadcastAreasRepository()
+            self._libraries = repo.get_libraries()
+            rows = repo.query(
+                """
+                SELECT id, name, count_of_phones, broadcast_area_library_id, broadcast_area_library_group_id
+                FROM broadcast_areas
+                WHERE broadcast_area_library_id NOT IN ({})
+                ORDER BY id
+                """.format(",".join("?" * len(UNCATALOGUED_LIBRARY_IDS))),
+                *UNCATALOGUED_LIBRARY_IDS,
+            )
+
+            self._library_ids = [library[0] for library in self._libraries]
+            library_indexes = {library_id: index for index, library_id in enumerate(self._library_ids)}
+
+            self._ids = [row[0] for row in rows]
+            self._index = {area_id: index for index, area_id in enumerate(self._ids)}
+            self._names = [row[1] for row in rows]
+            self._counts_of_phones = array("d", (NO_COUNT_OF_PHONES if row[2] is None else row[2] for row in rows))
+            self._library_indexes = array("H", (library_indexes[row[3]] for row in rows))
+            self._parents = array("i", (self._index.get(row[4], NO_PARENT) for row in rows))
+
+            self._children = {}
+            for index, parent in enumerate(self._parents):
+                if parent != NO_PARENT:
+                    self._children.setdefault(parent, array("i")).append(index)
+
+            self._library_summaries = self._summarise_libraries()
+
+            # The bulk list forms check every line someone enters against
+            # these, so they’re built once and shared by every request.
+            # They’re read only so one request can’t change them for others
+            self._library_area_ids = {library_id: set() for library_id in self._library_ids}
+            for area_id, library_index in zip(self._ids, self._library_indexes):
+                self._library_area_ids[self._library_ids[library_index]].add(area_id)
+            self._library_area_ids = {
+                library_id: frozenset(area_ids) for library_id, area_ids in self._library_area_ids.items()
+            }
+            self._local_authority_names_and_ids = MappingProxyType(
+                {
+                    self._names[index].lower(): area_id
+                    for index, area_id in enumerate(self._ids)
+                    if (
+                        area_id.startswith("lad25-")
+                        and self._library_ids[self._library_indexes[index]] == "wd25-lad25-ctyua25"
+                        or area_id.startswith("ctyua25-")
+                    )
+                }
+            )
+            self._local_authority_matcher = TrigramMatcher(
+                sorted(self._names[self._index[area_id]] for area_id in self._local_authority_names_and_ids.values())
+            )
+            self._flood_warning_area_matcher = TrigramMatcher(
+                sorted(
+                    area_id[len(FLOOD_WARNING_AREA_ID_PREFIX) :]
+                    for area_id in self._library_area_ids.get("Flood_Warning_Target_Areas", ())
+                )
+            )
+
+            self._loaded = True
+
+    def _summarise_libraries(self):
+        # The areas listed for a library with more than one tier are
+        # only those with children, the same as
+        # BroadcastAreasRepository.get_all_areas_for_library
+        area_indexes = {library_id: [] for library_id in self._library_ids}
+        for index, library_index in enumerate(self._library_indexes):
+            area_indexes[self._library_ids[library_index]].append(index)
+
+        summaries = {}
+        for library_id, indexes in area_indexes.items():
+            has_children = any(self._parents[index] != NO_PARENT for index in indexes)
+            if has_children and library_id != "REPPIR_DEPZ_sites":
+                indexes = [index for index in indexes if index in self._children]
+            summaries[library_id] = LibrarySummary(
+                count_of_areas=len(indexes),
+                example_names=heapq.nsmallest(NUMBER_OF_EXAMPLE_NAMES, (self._names[index] for index in indexes)),
+                has_children=has_children,
+            )
+        return summaries
+
+    @property
+    def size_in_bytes(self):
+        self.load()
+        return (
+            sum(sys.getsizeof(item) for item in (self._ids, self._names, self._index, self._children))
+            + sum(sys.getsizeof(area_id) + sys.getsizeof(name) for area_id, name in zip(self._ids, self._names))
+            + sum(sys.getsizeof(children) for children in self._children.values())
+            + sum(sys.getsizeof(area_ids) for area_ids in self._library_area_ids.values())
+            + sys.getsizeof(self._local_authority_names_and_ids.copy())
+            + sum(
+                column.itemsize * len(column)
+                for column in (self._counts_of_phones, self._library_indexes, self._parents)
+            )
+        )
+
+    def _row(self, index):
+        return (
+            self._ids[index],
+            self._names[index],
+            self._get_count_of_phones(index),
+            self._library_ids[self._library_indexes[index]],
+        )
+
+    def _get_count_of_phones(self, index):
+        # Stored as a float so that there’s room for the empty value, but
+        # given back as the same type as the database does. That’s an
+        # integer for whole numbers, because the column is an INTEGER
+        count_of_phones = self._counts_of_phones[index]
+        if isnan(count_of_phones):
+            return None
+        if count_of_phones.is_integer():
+            return int(count_of_phones)
+        return count_of_phones
+
+    def get_libraries(self):
+        self.load()
+        return list(self._libraries)
+
+    def get_library_summary(self, library_id):
+        self.load()
+        return self._library_summaries.get(library_id, LibrarySummary(0, [], False))
+
+    def get_areas(self, area_ids):
+        self.load()
+        area_ids = list(dict.fromkeys(area_ids))
+        uncatalogued_area_ids = [area_id for area_id in area_ids if area_id not in self._index]
+
+        areas = [self._row(self._index[area_id]) for area_id in area_ids if area_id in self._index]
+
+        if uncatalogued_area_ids:
+            areas += BroadcastAreasRepository().get_areas(uncatalogued_area_ids)
+
+        return areas
+
+    def _sub_area_indexes(self, group_id):
+        if group_id not in self._index:
+            return []
+        return [
+            index
+            for index in self._children.get(self._index[group_id], ())
+            # REPPIR sites aren’t shown as children of their local authority
+            if not self._ids[index].startswith("REPPIR_DEPZ_sites")
+        ]
+
+    def get_all_areas_for_group(self, group_id):
+        self.load()
+        return [self._row(index) for index in self._sub_area_indexes(group_id)]
+
+    def has_sub_areas(self, group_id):
+        self.load()
+        return bool(self._sub_area_indexes(group_id))
+
+    def get_parent_for_area(self, area_id):
+        self.load()
+        parent = self._parents[self._index[area_id]] if area_id in self._index else NO_PARENT
+        if parent == NO_PARENT:
+            return None
+        return self._row(parent)
+
+    def get_ancestors_for_areas(self, area_ids):
+        self.load()
+        ancestors = {}
+        for area_id in area_ids:
+            ancestors[area_id] = []
+            parent = self._parents[self._index[area_id]] if area_id in self._index else NO_PARENT
+            while parent != NO_PARENT:
+                ancestors[area_id].append(self._row(parent))
+                parent = self._parents[parent]
+        return ancestors
+
+    def get_area_ids_for_library(self, library_id):
+        self.load()
+        return self._library_area_ids.get(library_id, frozenset())
+
+    def get_all_area_names_and_ids_for_local_authorities(self):
+        self.load()
+        return self._local_authority_names_and_ids
+
+    def get_local_authority_matcher(self):
+        self.load()
+        return self._local_authority_matcher
+
+    def get_flood_warning_area_matcher(self):
+        # Matches the TA codes people enter, not the names of the areas
+        self.load()
+        return self._flood_warning_area_matcher
+
+
+area_catalogue = AreaCatalogue()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+"""
+Makes broadcast-areas.sqlite3 smaller before it’s uploaded to S3, so that
+it’s quicker to download and more of it fits in the page cache. Run it
+once the build scripts have finished:
+
+    ./compact-broadcast-areas-db.py
+
+It copies every area into a new database which:
+
+- stores coordinates as integers, at the precision Polygons rounds them to
+- only stores simple polygons which are different to the full polygons
+- doesn’t give the tables a rowid if they have their own primary key
+- uses bigger pages, so a set of polygons is split across fewer of them
+
+The build scripts can still add areas to a compacted database, so there’s
+no need to keep a copy of the original.
+"""
+
+import argparse
+import os
+import sqlite3
+
+from emergency_alerts_utils.polygons import Polygons
+from repo import BroadcastAreasRepository, pack_polygons, unpack_polygons
+
+DEFAULT_PAGE_SIZE = 16384
+
+# Everything except the tables of polygons, which are copied a row at a
+# time so their polygons can be packed again
+TABLES = (
+    "broadcast_area_libraries",
+    "broadcast_area_library_groups",
+    "broadcast_areas",
+    "area_ancestors",
+    "broadcast_area_metrics",
+    "postcode_centroids",
+    "broadcast_area_bounds_layers",
+    "broadcast_area_bounds",
+    "broadcast_area_names",
+)
+
+# Tables with a column of polygons, which are packed again as they’re
+# copied
+PACKED_TABLES = (
+    "broadcast_area_simplified_polygons",
+    "broadcast_area_ward_outlines",
+)
+
+POLYGONS_COLUMNS = ("id", "polygons", "simple_polygons", "utm_crs", "simple_polygons_with_bleed", "source_hash")
+
+
+def get_columns(conn, table, schema="main"):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def copy_table(conn, table):
+    # A database built by an older version of the scripts might be
+    # missing some columns, which are left empty
+    source_columns = get_columns(conn, table, schema="source")
+    columns = [column for column in get_columns(conn, table) if column in source_columns]
+
+    if columns:
+        conn.execute(f"INSERT INTO main.{table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM source.{table}")
+
+
+def quantise(polygons):
+    if polygons is None:
+        return None
+    return pack_polygons(unpack_polygons(polygons), decimal_places=Polygons.output_precision_in_decimal_places)
+
+
+def get_compacted_polygons(rows):
+    for id, polygons, simple_polygons, utm_crs, simple_polygons_with_bleed, source_hash in rows:
+        polygons = quantise(polygons)
+        simple_polygons = quantise(simple_polygons)
+
+        # Test areas, and anything too small to simplify, are the same
+        # either way
+        if simple_polygons == polygons:
+            simple_polygons = None
+
+        yield id, polygons, simple_polygons, utm_crs, quantise(simple_polygons_with_bleed), source_hash
+
+
+def copy_polygons(conn):
+    source_columns = get_columns(conn, "broadcast_area_polygons", schema="source")
+    rows = conn.execute(
+        "SELECT {} FROM source.broadcast_area_polygons".format(
+            ", ".join(column if column in source_columns else "NULL" for column in POLYGONS_COLUMNS)
+        )
+    )
+    conn.executemany(
+        "INSERT INTO main.broadcast_area_polygons ({}) VALUES ({})".format(
+            ", ".join(POLYGONS_COLUMNS), ", ".join("?" * len(POLYGONS_COLUMNS))
+        ),
+        get_compacted_polygons(rows),
+    )
+
+
+def copy_packed_table(conn, table):
+    source_columns = get_columns(conn, table, schema="source")
+    columns = [column for column in get_columns(conn, table) if column in source_columns]
+    rows = conn.execute(f"SELECT {', '.join(columns)} FROM source.{table}")
+
+    conn.executemany(
+        f"INSERT INTO main.{table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        ([quantise(value) if column == "polygons" else value for column, value in zip(columns, row)] for row in rows),
+    )
+
+
+def get_polygons_size_in_bytes(path):
+    conn = sqlite3.connect(str(path))
+    try:
+        return conn.execute("""
+        SELECT SUM(
+            COALESCE(LENGTH(polygons), 0)
+            + COALESCE(LENGTH(simple_polygons), 0)
+            + COALESCE(LENGTH(simple_polygons_with_bleed), 0)
+        )
+        FROM broadcast_area_polygons
+        """).fetchone()[0] or 0
+    finally:
+        conn.close()
+
+
+def compact(source, destination, page_size):
+    if destination.exists():
+        destination.unlink()
+
+    repo = BroadcastAreasRepository(read_only=False)
+    repo.database = destination
+    repo.create_tables()
+
+    with repo.bulk_load():
+        conn = repo.conn()
+        conn.execute("ATTACH DATABASE ? AS source", (str(source),))
+
+        with conn:
+            for table in TABLES:
+                if get_columns(conn, table, schema="source"):
+                    copy_table(conn, table)
+            copy_polygons(conn)
+            for table in PACKED_TABLES:
+                if get_columns(conn, table, schema="source"):
+                    copy_packed_table(conn, table)
+
+        conn.execute("DETACH DATABASE source")
+
+    # The page size of an existing database only changes when it’s
+    # vacuumed, which also leaves every table and index tightly packed
+    conn = sqlite3.connect(str(destination))
+    try:
+        conn.execute(f"PRAGMA page_size = {page_size}")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def format_size(size_in_bytes):
+    return f"{size_in_bytes / 1024 / 1024:,.1f} MB"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help=f"SQLite page size in bytes, a power of two from 512 to 65536 (default {DEFAULT_PAGE_SIZE})",
+    )
+    args = parser.parse_args()
+
+    source = BroadcastAreasRepository().database
+    destination = source.with_name(f"{source.stem}.compacting{source.suffix}")
+
+    size_before = source.stat().st_size
+    polygons_size_before = get_polygons_size_in_bytes(source)
+
+    compact(source, destination, args.page_size)
+    os.replace(destination, source)
+
+    size_after = source.stat().st_size
+    polygons_size_after = get_polygons_size_in_bytes(source)
+
+    print(
+        f"{source.name}: {format_size(size_before)} -> {format_size(size_after)} ({size_after / size_before - 1:+.0%})"
+    )
+    print(f"  Polygons: {format_size(polygons_size_before)} -> {format_size(polygons_size_after)}")
@@ -1,12 +1,15 @@
 #!/usr/bin/env python
 
+import argparse
 import csv
-import pickle
-import sys
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from math import isclose
 from pathlib import Path
 
-import geojson
 from emergency_alerts_utils.formatters import formatted_list
 from emergency_alerts_utils.polygons import Polygons
 from populations import (
@@ -14,15 +17,16 @@ from populations import (
     MEDIAN_AGE_UK,
     estimate_number_of_smartphones_for_population,
 )
-from repo import BroadcastAreasRepository, rtree_index_path
-from rtreelib import Rect, RTree
+from repo import BroadcastAreasRepository, get_source_hash
 from shapely import wkt
 from shapely.geometry import MultiPolygon, Polygon
+from streaming import iter_features
 
 source_files_path = Path(__file__).resolve().parent / "source_files"
 point_counts = []
 invalid_polygons = []
-rtree_index = RTree()
+unchanged_features = []
+timings = {}
 
 # The hard limit in the CBCs is 6,000 points per polygon. But we also
 # care about optimising how quickly we can process and display polygons
@@ -30,6 +34,23 @@ rtree_index = RTree()
 # precision relative to the accuracy of a cell broadcast
 MAX_NUMBER_OF_POINTS_PER_POLYGON = 250
 
+# How many features each worker can have queued up ahead of the one
+# being written to the database, so that the workers never wait for the
+# parent but don’t hold a whole dataset’s worth of results in memory
+FEATURES_QUEUED_PER_WORKER = 4
+
+ProcessedFeature = namedtuple(
+    "ProcessedFeature",
+    ["polygons", "simple_polygons", "utm_crs", "point_count", "invalid_polygons", "log"],
+)
+
+# How this run processes features, which is decided by the command line
+# arguments
+Processing = namedtuple(
+    "Processing",
+    ["keep_old_polygons", "stored_source_hashes", "executor", "number_of_workers"],
+)
+
 
 def simplify_geometry(feature):
     if feature["type"] == "Polygon":
@@ -40,7 +61,7 @@ def simplify_geometry(feature):
         raise Exception("Unknown type: {}".format(feature["type"]))
 
 
-def clean_up_invalid_polygons(polygons, indent="    "):
+def clean_up_invalid_polygons(polygons, log, invalid_polygons, indent="    "):
     """
     This function expects a list of lists of coordinates defined in degrees
     """
@@ -60,7 +81,7 @@ def clean_up_invalid_polygons(polygons, indent="    "):
         ).simplify(0)
 
         if simplified_polygon.is_valid:
-            print(f"{indent}Polygon {index + 1}/{len(polygons)} is valid")
+            log.append(f"{indent}Polygon {index + 1}/{len(polygons)} is valid")
             yield simplified_polygon
 
         else:
@@ -70,10 +91,10 @@ def clean_up_invalid_polygons(polygons, indent="    "):
             # don’t have an area. They wouldn’t contribute to a broadcast
             # so we can ignore them.
             if simplified_polygon.area == 0:
-                print(f"{indent}Polygon {index + 1}/{len(polygons)} has 0 area, skipping")
+                log.append(f"{indent}Polygon {index + 1}/{len(polygons)} has 0 area, skipping")
                 continue
 
-            print(f"{indent}Polygon {index + 1}/{len(polygons)} needs fixing...")
+            log.append(f"{indent}Polygon {index + 1}/{len(polygons)} needs fixing...")
 
             # Buffering with a size of 0 is a trick to make valid
             # geometries from polygons that self intersect
@@ -83,7 +104,7 @@ def clean_up_invalid_polygons(polygons, indent="    "):
             # multiple polygons, we need to recursively check them
             # instead
             if isinstance(buffered, MultiPolygon):
-                for sub_polygon in clean_up_invalid_polygons(buffered, indent="        "):
+                for sub_polygon in clean_up_invalid_polygons(buffered, log, invalid_polygons, indent="        "):
                     yield sub_polygon
                 continue
 
@@ -97,19 +118,23 @@ def clean_up_invalid_polygons(polygons, indent="    "):
             assert fixed_polygon.is_valid
             assert isclose(fixed_polygon.area, shapely_polygon.area, rel_tol=0.001)
 
-            print(f"{indent}Polygon {index + 1}/{len(polygons)} fixed!")
+            log.append(f"{indent}Polygon {index + 1}/{len(polygons)} fixed!")
 
             yield fixed_polygon
 
 
 def polygons_and_simplified_polygons(feature):
-    if keep_old_polygons:
-        # cheat and shortcut out
-        return [], [], []
+    """
+    Runs in a worker process, so rather than printing or counting as it
+    goes it returns everything the parent needs to report on the feature
+    """
+    log = []
+    invalid_polygons = []
 
     raw_polygons = simplify_geometry(feature)
     clean_raw_polygons = [
-        [[x, y] for x, y in polygon.exterior.coords] for polygon in clean_up_invalid_polygons(raw_polygons)
+        [[x, y] for x, y in polygon.exterior.coords]
+        for polygon in clean_up_invalid_polygons(raw_polygons, log, invalid_polygons)
     ]
     polygons = Polygons(clean_raw_polygons)
 
@@ -120,14 +145,12 @@ def polygons_and_simplified_polygons(feature):
     if not (len(full_resolution) or len(simplified)):
         raise RuntimeError("Polygon of 0 size found")
 
-    print(
+    log.append(
         f"    Original:{full_resolution.point_count: >5} points"
         f"    Smoothed:{smoothed.point_count: >5} points"
         f"    Simplified:{simplified.point_count: >4} points"
     )
 
-    point_counts.append(simplified.point_count)
-
     if simplified.point_count >= MAX_NUMBER_OF_POINTS_PER_POLYGON:
         raise RuntimeError(
             "Too many points "
@@ -145,7 +168,71 @@ def polygons_and_simplified_polygons(feature):
         for polygon in dataset:
             assert Polygon(polygon).is_valid
 
-    return output + [simplified.utm_crs]
+    return ProcessedFeature(*output, simplified.utm_crs, simplified.point_count, invalid_polygons, log)
+
+
+def process_features(features, name_property, get_area_id, processing):
+    """
+    Yields `(properties, polygons, simple_polygons, utm_crs, source_hash)`
+    for each GeoJSON feature, in the same order, while the features after
+    it are processed in parallel. Output is printed by the parent as each
+    result is used, so it reads the same as a serial run.
+
+    Features which haven’t changed since the database was last built
+    aren’t processed again when building incrementally. Their polygons
+    are None, so the ones already stored are kept
+    """
+    if processing.keep_old_polygons:
+        # cheat and shortcut out
+        for feature in features:
+            print()
+            print(feature["properties"][name_property])
+            yield feature["properties"], [], [], [], None
+        return
+
+    executor = processing.executor
+
+    def process(feature):
+        properties = feature["properties"]
+        source_hash = get_source_hash(feature)
+        if processing.stored_source_hashes.get(get_area_id(properties)) == source_hash:
+            return properties, source_hash, None
+        if executor is None:
+            return properties, source_hash, polygons_and_simplified_polygons(feature["geometry"])
+        return properties, source_hash, executor.submit(polygons_and_simplified_polygons, feature["geometry"])
+
+    def report(properties, source_hash, result):
+        print()
+        print(properties[name_property])
+
+        if result is None:
+            print("    Unchanged since the last build")
+            unchanged_features.append(source_hash)
+            return properties, None, None, None, source_hash
+
+        if executor is not None:
+            result = result.result()
+
+        print("\n".join(result.log))
+        point_counts.append(result.point_count)
+        invalid_polygons.extend(result.invalid_polygons)
+        return properties, result.polygons, result.simple_polygons, result.utm_crs, source_hash
+
+    queued = deque()
+    for feature in features:
+        queued.append(process(feature))
+        if len(queued) >= processing.number_of_workers * FEATURES_QUEUED_PER_WORKER:
+            yield report(*queued.popleft())
+
+    while queued:
+        yield report(*queued.popleft())
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    yield
+    timings[stage] = time.perf_counter() - start
 
 
 def estimate_number_of_smartphones_in_area(country_or_ward_code):
@@ -223,76 +310,72 @@ for population_filepath in (
         ]
 
 
-def add_test_areas():
+def add_test_areas(processing):
     dataset_id = "test"
-    dataset_geojson = geojson.loads(test_filepath.read_text())
     repo.insert_broadcast_area_library(
         dataset_id,
         name="Test areas",
         name_singular="test area",
         is_group=False,
     )
-
-    areas_to_add = []
-    for feature in dataset_geojson["features"]:
-        f_id = feature["properties"]["id"]
-        f_name = feature["properties"]["name"]
-
-        print()
-        print(f_name)
-
-        feature, _, utm_crs = polygons_and_simplified_polygons(feature["geometry"])
-        areas_to_add.append(
-            [
-                f"{dataset_id}-{f_id}",
-                f_name,
-                dataset_id,
-                None,
-                feature,
-                feature,
-                utm_crs,
-                0,
-            ]
-        )
-    repo.insert_broadcast_areas(areas_to_add, keep_old_polygons)
+    repo.insert_broadcast_areas(_get_test_areas(dataset_id, processing), processing.keep_old_polygons)
+
+
+def _get_test_areas(dataset_id, processing):
+    for properties, feature, _, utm_crs, source_hash in process_features(
+        iter_features(test_filepath), "name", lambda properties: f"{dataset_id}-{properties['id']}", processing
+    ):
+        f_id = properties["id"]
+        f_name = properties["name"]
+
+        yield [
+            f"{dataset_id}-{f_id}",
+            f_name,
+            dataset_id,
+            None,
+            feature,
+            feature,
+            utm_crs,
+            0,
+            source_hash,
+        ]
 
 
-def add_countries():
+def add_countries(processing):
     dataset_id = "ctry19"
-    dataset_geojson = geojson.loads(ctry19_filepath.read_text())
     repo.insert_broadcast_area_library(
         "ctry19",
         name="Countries",
         name_singular="country",
         is_group=False,
     )
-
-    areas_to_add = []
-    for feature in dataset_geojson["features"]:
-        f_id = feature["properties"]["ctry19cd"]
-        f_name = feature["properties"]["ctry19nm"]
-
-        print()
-        print(f_name)
-
-        feature, simple_feature, utm_crs = polygons_and_simplified_polygons(feature["geometry"])
-        areas_to_add.append(
-            [
-                f"ctry19-{f_id}",
-                f_name,
-                dataset_id,
-                None,
-                feature,
-                simple_feature,
-                utm_crs,
-                estimate_number_of_smartphones_in_area(f_id),
-            ]
-        )
-
-    repo.insert_broadcast_areas(areas_to_add, keep_old_polygons)
+    repo.insert_broadcast_areas(_get_countries(dataset_id, processing), processing.keep_old_polygons)
+
+
+def _get_countries(dataset_id, processing):
+    for properties, feature, simple_feature, utm_crs, source_hash in process_features(
+        iter_features(ctry19_filepath),
+        "ctry19nm",
+        lambda properties: f"ctry19-{properties['ctry19cd']}",
+        processing,
+    ):
+        f_id = properties["ctry19cd"]
+        f_name = properties["ctry19nm"]
+
+        yield [
+            f"ctry19-{f_id}",
+            f_name,
+            dataset_id,
+            None,
+            feature,
+            simple_feature,
+            utm_crs,
+            estimate_number_of_smartphones_in_area(f_id),
+            source_hash,
+        ]
 
 
-def add_wards_local_authorities_and_counties():
+def add_wards_local_authorities_and_counties(processing):
     dataset_name = "Local authorities"
     dataset_name_singular = "local authority"
     dataset_id = "wd25-lad25-ctyua25"
@@ -302,138 +385,179 @@ def add_wards_local_authorities_and_counties():
         name_singular=dataset_name_singular,
         is_group=True,
     )
-    _add_electoral_wards(dataset_id)
-    _add_local_authorities(dataset_id)
-    _add_counties_and_unitary_authorities(dataset_id)
-
+    repo.insert_broadcast_areas(_get_electoral_wards(dataset_id, processing), processing.keep_old_polygons)
+    repo.insert_broadcast_areas(_get_local_authorities(dataset_id, processing), processing.keep_old_polygons)
+
+    # Queried up front, because the counties are read while they’re
+    # being inserted
+    local_authority_ids = {
+        area_id for (area_id,) in repo.query("SELECT id FROM broadcast_areas WHERE id LIKE 'lad25-%'")
+    }
+    repo.insert_broadcast_areas(
+        _get_counties_and_unitary_authorities(dataset_id, local_authority_ids, processing),
+        processing.keep_old_polygons,
+    )
 
-def _add_electoral_wards(dataset_id):
-    areas_to_add = []
 
-    for feature in geojson.loads(wd25_filepath.read_text())["features"]:
-        ward_code = feature["properties"]["WD25CD"]
-        ward_name = feature["properties"]["WD25NM"]
+def _get_electoral_wards(dataset_id, processing):
+    for properties, feature, simple_feature, utm_crs, source_hash in process_features(
+        iter_features(wd25_filepath),
+        "WD25NM",
+        lambda properties: f"wd25-{properties['WD25CD']}",
+        processing,
+    ):
+        ward_code = properties["WD25CD"]
+        ward_name = properties["WD25NM"]
         ward_id = "wd25-" + ward_code
 
-        print()
-        print(ward_name)
-
         la_id = "lad25-" + ward_code_to_la_id_mapping[ward_code]
 
-        feature, simple_feature, utm_crs = polygons_and_simplified_polygons(feature["geometry"])
-
-        if feature:
-            rtree_index.insert(ward_id, Rect(*Polygons(feature).bounds))
-
-        areas_to_add.append(
-            [
-                ward_id,
-                ward_name,
-                dataset_id,
-                la_id,
-                feature,
-                simple_feature,
-                utm_crs,
-                estimate_number_of_smartphones_in_area(ward_code),
-            ]
-        )
-
-    rtree_index_path.open("wb").write(pickle.dumps(rtree_index))
-    repo.insert_broadcast_areas(areas_to_add, keep_old_polygons)
-
-
-def _add_local_authorities(dataset_id):
-    areas_to_add = []
+        yield [
+            ward_id,
+            ward_name,
+            dataset_id,
+            la_id,
+            feature,
+            simple_feature,
+            utm_crs,
+            estimate_number_of_smartphones_in_area(ward_code),
+            source_hash,
+        ]
 
-    for feature in geojson.loads(lad25_filepath.read_text())["features"]:
-        la_id = feature["properties"]["LAD25CD"]
-        group_name = feature["properties"]["LAD25NM"]
 
-        print()
-        print(group_name)
+def _get_local_authorities(dataset_id, processing):
+    for properties, feature, simple_feature, utm_crs, source_hash in process_features(
+        iter_features(lad25_filepath),
+        "LAD25NM",
+        lambda properties: f"lad25-{properties['LAD25CD']}",
+        processing,
+    ):
+        la_id = properties["LAD25CD"]
+        group_name = properties["LAD25NM"]
 
         group_id = "lad25-" + la_id
 
-        feature, simple_feature, utm_crs = polygons_and_simplified_polygons(feature["geometry"])
-
         ctyua_id = la_code_to_cty_id_mapping.get(la_id)
-        areas_to_add.append(
-            [
-                group_id,
-                group_name,
-                dataset_id,
-                "ctyua25-" + ctyua_id if ctyua_id else None,
-                feature,
-                simple_feature,
-                utm_crs,
-                None,
-            ]
-        )
-    repo.insert_broadcast_areas(areas_to_add, keep_old_polygons)
+        yield [
+            group_id,
+            group_name,
+            dataset_id,
+            "ctyua25-" + ctyua_id if ctyua_id else None,
+            feature,
+            simple_feature,
+            utm_crs,
+            None,
+            source_hash,
+        ]
 
 
 # counties and unitary authorities
-def _add_counties_and_unitary_authorities(dataset_id):
-    areas_to_add = []
-    for feature in geojson.loads(ctyua24_filepath.read_text())["features"]:
-        ctyua_id = feature["properties"]["CTYUA24CD"]
-        group_name = feature["properties"]["CTYUA24NM"]
-
+def _get_counties_and_unitary_authorities(dataset_id, local_authority_ids, processing):
+    features = (
+        feature
+        for feature in iter_features(ctyua24_filepath)
         # la_id begins with lad25 because corresponding pop data is for 2025
-        la_id = f"lad25-{ctyua_id}"
-        if repo.get_areas([la_id]):
-            continue
-
-        print()
-        print(group_name)
+        # Unitary authorities have already been added as local authorities
+        if f"lad25-{feature['properties']['CTYUA24CD']}" not in local_authority_ids
+    )
+    for properties, feature, simple_feature, utm_crs, source_hash in process_features(
+        features, "CTYUA24NM", lambda properties: f"ctyua25-{properties['CTYUA24CD']}", processing
+    ):
+        ctyua_id = properties["CTYUA24CD"]
+        group_name = properties["CTYUA24NM"]
 
         # group_id begins with ctyua25 because corresponding pop data is for 2025
         group_id = "ctyua25-" + ctyua_id
 
-        feature, simple_feature, utm_crs = polygons_and_simplified_polygons(feature["geometry"])
-
-        areas_to_add.append(
-            [
-                group_id,
-                group_name,
-                dataset_id,
-                None,
-                feature,
-                simple_feature,
-                utm_crs,
-                None,
-            ]
-        )
+        yield [
+            group_id,
+            group_name,
+            dataset_id,
+            None,
+            feature,
+            simple_feature,
+            utm_crs,
+            None,
+            source_hash,
+        ]
 
-    repo.insert_broadcast_areas(areas_to_add, keep_old_polygons)
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--keep-old-polygons", action="store_true")
+    mode.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "only process features which have changed since the database was last built. "
+            "Rebuild in full after changing how polygons are processed"
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of processes to clean up and simplify polygons in (default: number of CPUs)",
+    )
+    args = parser.parse_args()
 
-# cheeky global variable
-keep_old_polygons = sys.argv[1:] == ["--keep-old-polygons"]
-print("keep_old_polygons: ", keep_old_polygons)
+    # cheeky global variable
+    repo = BroadcastAreasRepository(read_only=False)
 
-repo = BroadcastAreasRepository()
+    number_of_workers = max(1, args.workers)
+    print("keep_old_polygons: ", args.keep_old_polygons)
+    print("incremental: ", args.incremental)
+    print("workers: ", number_of_workers)
 
-if keep_old_polygons:
-    repo.delete_library_data()
-else:
-    repo.delete_db()
-    repo.create_tables()
+    if args.keep_old_polygons or args.incremental:
+        repo.delete_library_data()
+    else:
+        repo.delete_db()
+        repo.create_tables()
+
+    # With one worker everything runs in this process, which is easier
+    # to debug
+    executor = ProcessPoolExecutor(number_of_workers) if number_of_workers > 1 else None
+
+    with timed("Total"), repo.bulk_load():
+        processing = Processing(
+            keep_old_polygons=args.keep_old_polygons,
+            stored_source_hashes=repo.get_source_hashes() if args.incremental else {},
+            executor=executor,
+            number_of_workers=number_of_workers,
+        )
 
-add_test_areas()
-add_countries()
-add_wards_local_authorities_and_counties()
+        # Each library goes in as one transaction
+        with timed("Test areas"), repo.transaction():
+            add_test_areas(processing)
+        with timed("Countries"), repo.transaction():
+            add_countries(processing)
+        with timed("Wards, local authorities and counties"), repo.transaction():
+            add_wards_local_authorities_and_counties(processing)
+        with timed("Indexes"):
+            repo.build_indexes()
+
+    if executor:
+        executor.shutdown()
+
+    most_detailed_polygons = formatted_list(
+        sorted(point_counts, reverse=True)[:5],
+        before_each="",
+        after_each="",
+    )
 
-most_detailed_polygons = formatted_list(
-    sorted(point_counts, reverse=True)[:5],
-    before_each="",
-    after_each="",
-)
+    print(
+        "\n"
+        "DONE\n"
+        f"    Processed {len(point_counts):,} polygons.\n"
+        f"    Cleaned up {len(invalid_polygons):,} polygons.\n"
+        f"    Kept {len(unchanged_features):,} unchanged polygons.\n"
+        f"    Highest point counts once simplifed: {most_detailed_polygons}\n"
+    )
 
-print(
-    "\n"
-    "DONE\n"
-    f"    Processed {len(point_counts):,} polygons.\n"
-    f"    Cleaned up {len(invalid_polygons):,} polygons.\n"
-    f"    Highest point counts once simplifed: {most_detailed_polygons}\n"
-)
+    print(f"Timings with {number_of_workers} worker{'s' if number_of_workers > 1 else ''}:")
+    for stage, seconds in timings.items():
+        print(f"    {stage + ':': <40}{seconds: >8.1f} seconds")
+    if point_counts and timings["Total"]:
+        print(f"    {'Features per second:': <40}{len(point_counts) / timings['Total']: >8.1f}")
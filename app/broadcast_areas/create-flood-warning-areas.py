@@ -1,17 +1,16 @@
 #!/usr/bin/env python
 
-import sys
+import argparse
 from pathlib import Path
 
-import geojson
 from emergency_alerts_utils.formatters import formatted_list
 from emergency_alerts_utils.polygons import Polygons
-from repo import BroadcastAreasRepository
-from rtreelib import RTree
+from repo import BroadcastAreasRepository, get_source_hash
+from streaming import iter_features
 
 source_files_path = Path(__file__).resolve().parent / "source_files"
 point_counts = []
-rtree_index = RTree()
+unchanged_features = []
 
 
 def simplify_geometry(feature):
@@ -31,6 +30,8 @@ def polygons_and_simplified_polygons(feature, id):
 
     simplified = polygons.simplify
 
+    point_counts.append(polygons.point_count)
+
     output = [
         polygons.as_coordinate_pairs_long_lat,
         polygons.as_coordinate_pairs_long_lat,
@@ -42,46 +43,81 @@ def polygons_and_simplified_polygons(feature, id):
 flood_warning_filepath = source_files_path / "FWS_flood_warning_polygons.geojson"
 
 
-def add_test_areas():
+def add_test_areas(keep_old_polygons, stored_source_hashes):
     dataset_id = "Flood_Warning_Target_Areas"
-    dataset_geojson = geojson.loads(flood_warning_filepath.read_text())
+    # The areas from the last time the script was run would clash with
+    # the ones about to be inserted. Their polygons are kept, for
+    # --keep-old-polygons and --incremental
+    repo.delete_library(dataset_id)
     repo.insert_broadcast_area_library(
         dataset_id,
         name="Flood Warning Target Areas",
         name_singular="Flood Warning Target Area",
         is_group=False,
     )
+    repo.insert_broadcast_areas(get_test_areas(dataset_id, stored_source_hashes), keep_old_polygons)
+
 
-    areas_to_add = []
-    for feature in dataset_geojson["features"]:
+def get_test_areas(dataset_id, stored_source_hashes):
+    # Features are read and inserted a batch at a time, rather than
+    # holding every flood warning area in memory
+    for feature in iter_features(flood_warning_filepath):
         f_id = feature["properties"]["tacode"]
         f_name = feature["properties"]["name"].replace("_", " ")
+        source_hash = get_source_hash(feature)
+
+        if stored_source_hashes.get(f"{dataset_id}-{f_id}") == source_hash:
+            # Unchanged since the last build, so the stored polygons are kept
+            unchanged_features.append(source_hash)
+            feature = utm_crs = None
+        else:
+            feature, _, utm_crs = polygons_and_simplified_polygons(feature["geometry"], f_id)
+
+        yield [
+            f"{dataset_id}-{f_id}",
+            f_name,
+            dataset_id,
+            None,
+            feature,
+            feature,
+            utm_crs,
+            0,
+            source_hash,
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--keep-old-polygons", action="store_true")
+    mode.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only process flood warning areas which have changed since the database was last built",
+    )
+    args = parser.parse_args()
+
+    # cheeky global variable
+    repo = BroadcastAreasRepository(read_only=False)
+
+    with repo.bulk_load():
+        with repo.transaction():
+            add_test_areas(
+                args.keep_old_polygons,
+                repo.get_source_hashes() if args.incremental else {},
+            )
+        repo.build_indexes()
+
+    most_detailed_polygons = formatted_list(
+        sorted(point_counts, reverse=True)[:5],
+        before_each="",
+        after_each="",
+    )
 
-        feature, _, utm_crs = polygons_and_simplified_polygons(feature["geometry"], f_id)
-        areas_to_add.append(
-            [
-                f"{dataset_id}-{f_id}",
-                f_name,
-                dataset_id,
-                None,
-                feature,
-                feature,
-                utm_crs,
-                0,
-            ]
-        )
-    repo.insert_broadcast_areas(areas_to_add, keep_old_polygons)
-
-
-# cheeky global variable
-keep_old_polygons = sys.argv[1:] == ["--keep-old-polygons"]
-
-repo = BroadcastAreasRepository()
-
-add_test_areas()
-
-most_detailed_polygons = formatted_list(
-    sorted(point_counts, reverse=True)[:5],
-    before_each="",
-    after_each="",
-)
+    print(  # noqa: T201
+        "\n"
+        "DONE\n"
+        f"    Processed {len(point_counts):,} polygons.\n"
+        f"    Kept {len(unchanged_features):,} unchanged polygons.\n"
+        f"    Highest point counts: {most_detailed_polygons}\n"
+    )
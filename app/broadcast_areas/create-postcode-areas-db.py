@@ -3,18 +3,17 @@
 import os
 from pathlib import Path
 
-import geojson
 from emergency_alerts_utils.formatters import formatted_list
 from emergency_alerts_utils.polygons import Polygons
-from repo import BroadcastAreasRepository
-from rtreelib import RTree
+from repo import BroadcastAreasRepository, get_source_hash
 from shapely import wkt
 from shapely.geometry import MultiPolygon, Polygon
+from streaming import iter_features
 
 postcode_files_path = Path(__file__).resolve().parent / "postcode_areas"
 point_counts = []
 invalid_polygons = []
-rtree_index = RTree()
+number_of_unchanged_features = 0
 
 # The hard limit in the CBCs is 6,000 points per polygon. But we also
 # care about optimising how quickly we can process and display polygons
@@ -22,7 +21,7 @@ rtree_index = RTree()
 # precision relative to the accuracy of a cell broadcast
 MAX_NUMBER_OF_POINTS_PER_POLYGON = 250
 
-repo = BroadcastAreasRepository()
+repo = BroadcastAreasRepository(read_only=False)
 
 
 def simplify_geometry(feature):
@@ -157,31 +156,47 @@ def polygons_and_simplified_polygons(feature, name, postcode):
 
 
 def add_postcode_areas(postcode_filepath):
+    # Centroids are small enough to insert all at once, but the areas are
+    # inserted a batch at a time as they’re read from the file
+    centroids_to_add = []
+    repo.insert_broadcast_areas(get_postcode_areas(postcode_filepath, centroids_to_add), keep_old_polygons)
+    repo.insert_postcode_centroids(centroids_to_add)
+
+
+def get_postcode_areas(postcode_filepath, centroids_to_add):
+    global number_of_unchanged_features
     dataset_id = "postcodes"
-    dataset_geojson = geojson.loads(postcode_filepath.read_text())
 
-    areas_to_add = []
-    for feature in dataset_geojson["features"]:
+    for feature in iter_features(postcode_filepath):
         f_id = feature["properties"]["POSTCODE"]
         f_name = feature["properties"]["POSTCODE"]
+        source_hash = get_source_hash(feature)
+
+        if repo.get_source_hash_for_area(f"{dataset_id}-{f_id}") == source_hash:
+            # Unchanged since it was last added, so the stored polygons
+            # and centroid are kept
+            number_of_unchanged_features += 1
+            yield [f"{dataset_id}-{f_id}", f_name, dataset_id, None, None, None, None, 0, source_hash]
+            continue
 
         feature, _, utm_crs = polygons_and_simplified_polygons(feature["geometry"], dataset_id, f_name)
 
         if feature is not None:
-            areas_to_add.append(
-                [
-                    f"{dataset_id}-{f_id}",
-                    f_name,
-                    dataset_id,
-                    None,
-                    feature,
-                    feature,
-                    utm_crs,
-                    0,
-                ]
-            )
-
-    repo.insert_broadcast_areas(areas_to_add, keep_old_polygons)
+            # The same point as taking the centroid of the area’s first polygon
+            centroid = Polygon(feature[0]).centroid
+            centroids_to_add.append([f"{dataset_id}-{f_id}", centroid.y, centroid.x, utm_crs])
+
+            yield [
+                f"{dataset_id}-{f_id}",
+                f_name,
+                dataset_id,
+                None,
+                feature,
+                feature,
+                utm_crs,
+                0,
+                source_hash,
+            ]
 
 
 def check_postcode_library_exists():
@@ -199,11 +214,16 @@ keep_old_polygons = False
 
 postcode_files = os.listdir(postcode_files_path)
 
-check_postcode_library_exists()
+with repo.bulk_load():
+    check_postcode_library_exists()
+
+    for file in postcode_files:
+        # Each file is committed before it’s removed
+        with repo.transaction():
+            add_postcode_areas(postcode_files_path / file)
+        os.remove(postcode_files_path / file)
 
-for file in postcode_files:
-    add_postcode_areas(postcode_files_path / file)
-    os.remove(postcode_files_path / file)
+    repo.build_indexes()
 
 
 most_detailed_polygons = formatted_list(
@@ -217,5 +237,6 @@ print(
     "DONE\n"
     f"    Processed {len(point_counts):,} polygons.\n"
     f"    Cleaned up {len(invalid_polygons):,} polygons.\n"
+    f"    Kept {number_of_unchanged_features:,} unchanged polygons.\n"
     f"    Highest point counts once simplifed: {most_detailed_polygons}\n"
 )
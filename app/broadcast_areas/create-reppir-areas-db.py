@@ -8,15 +8,13 @@ from pathlib import Path
 import geojson
 from emergency_alerts_utils.formatters import formatted_list
 from emergency_alerts_utils.polygons import Polygons
-from repo import BroadcastAreasRepository
-from rtreelib import RTree
+from repo import BroadcastAreasRepository, get_source_hash
 from shapely import wkt
 from shapely.geometry import MultiPolygon, Polygon
 
 source_files_path = Path(__file__).resolve().parent / "source_files"
 point_counts = []
 invalid_polygons = []
-rtree_index = RTree()
 
 # The hard limit in the CBCs is 6,000 points per polygon. But we also
 # care about optimising how quickly we can process and display polygons
@@ -164,6 +162,7 @@ def add_test_areas():
     for feature in dataset_geojson["features"]:
         f_id = feature["properties"]["id"]
         f_name = feature["properties"]["name"].replace("_", " ")
+        source_hash = get_source_hash(feature)
 
         feature, _, utm_crs = polygons_and_simplified_polygons(feature["geometry"])
         areas_to_add.append(
@@ -176,6 +175,7 @@ def add_test_areas():
                 feature,
                 utm_crs,
                 0,
+                source_hash,
             ]
         )
     repo.insert_broadcast_areas(areas_to_add, keep_old_polygons)
@@ -184,9 +184,12 @@ def add_test_areas():
 # cheeky global variable
 keep_old_polygons = sys.argv[1:] == ["--keep-old-polygons"]
 
-repo = BroadcastAreasRepository()
+repo = BroadcastAreasRepository(read_only=False)
 
-add_test_areas()
+with repo.bulk_load():
+    with repo.transaction():
+        add_test_areas()
+    repo.build_indexes()
 
 most_detailed_polygons = formatted_list(
     sorted(point_counts, reverse=True)[:5],
@@ -0,0 +1,71 @@
+import heapq
+import re
+from collections import Counter
+
+# How alike two names need to be, from 0 to 1, before one is suggested
+# for the other
+MINIMUM_SIMILARITY = 0.4
+
+# Trigrams shared by more than this fraction of names (like the region
+# number at the start of a Flood Warning TA code) say almost nothing about
+# which name was meant, so they aren’t used to find candidates
+COMMON_TRIGRAM_FRACTION = 0.1
+MINIMUM_COMMON_TRIGRAM_COUNT = 50
+
+# Only the names sharing the most uncommon trigrams with what was entered
+# are scored in full
+NUMBER_OF_CANDIDATES = 50
+
+
+def normalise(name):
+    return " ".join(re.sub(r"[^\w]+", " ", name.lower()).split())
+
+
+def get_trigrams(name):
+    # Padding the start means short names and first letters count for
+    # more, which is where people tend to get them right
+    padded = f"  {normalise(name)} "
+    return frozenset(padded[index : index + 3] for index in range(len(padded) - 2))
+
+
+class TrigramMatcher:
+    """
+    Suggests which of a fixed set of names someone meant when what they
+    entered doesn’t match any of them exactly, by comparing the sets of
+    three letter sequences in each.
+    """
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self._trigrams = tuple(get_trigrams(name) for name in self.names)
+
+        postings = {}
+        for index, trigrams in enumerate(self._trigrams):
+            for trigram in trigrams:
+                postings.setdefault(trigram, []).append(index)
+
+        maximum_postings = max(MINIMUM_COMMON_TRIGRAM_COUNT, len(self.names) * COMMON_TRIGRAM_FRACTION)
+        self._postings = {
+            trigram: tuple(indexes) for trigram, indexes in postings.items() if len(indexes) <= maximum_postings
+        }
+
+    def __len__(self):
+        return len(self.names)
+
+    def suggest(self, name, limit=3):
+        trigrams = get_trigrams(name)
+        candidates = Counter()
+        for trigram in trigrams:
+            candidates.update(self._postings.get(trigram, ()))
+
+        scores = []
+        for index, _count in candidates.most_common(NUMBER_OF_CANDIDATES):
+            # Dice’s coefficient
+            similarity = 2 * len(trigrams & self._trigrams[index]) / (len(trigrams) + len(self._trigrams[index]))
+            if similarity >= MINIMUM_SIMILARITY:
+                scores.append((-similarity, self.names[index]))
+
+        return [name for _similarity, name in heapq.nsmallest(limit, scores)]
+
+    def suggest_for_all(self, names, limit=3):
+        return {name: self.suggest(name, limit=limit) for name in dict.fromkeys(names)}
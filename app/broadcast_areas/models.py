@@ -1,19 +1,76 @@
 import math
+import threading
 from abc import ABC, abstractmethod
 
 from emergency_alerts_utils.formatters import formatted_list
 from emergency_alerts_utils.polygons import Polygons
 from emergency_alerts_utils.serialised_model import SerialisedModelCollection
-from rtreelib import Rect
-from shapely import MultiPolygon, Polygon
+from shapely import MultiPolygon, Point, Polygon
 from werkzeug.utils import cached_property
 
 from app.broadcast_areas.populations import CITY_OF_LONDON
+from app.config import Config
 from app.formatters import square_metres_to_square_miles
 from app.models import SortingAndEqualityMixin
 from app.notify_client.broadcast_message_api_client import broadcast_message_api_client
 
-from .repo import BroadcastAreasRepository, rtree_index
+from .cache import PolygonsCache
+from .catalogue import UNCATALOGUED_LIBRARY_IDS, area_catalogue
+from .repo import BroadcastAreasRepository, estimate_bleed_in_m
+
+polygons_cache = PolygonsCache(Config.BROADCAST_AREA_POLYGONS_CACHE_SIZE_IN_BYTES)
+
+
+class SharedAreaAttributes:
+    """
+    The attributes of a library area which only depend on the areas
+    database. That can’t change while the app is running, so they’re
+    worked out once per area per process and shared by every request.
+
+    Only plain rows are stored here, never `BroadcastArea` instances,
+    because anything which comes from the API (like the count of phones)
+    mustn’t be shared between requests.
+    """
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self):
+        self._values = {}
+        # Re-entrant, so loading one attribute can depend on another
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_area(cls, area_id, library_id):
+        # There are millions of postcode areas, so keeping theirs would
+        # grow without limit. They’re only shared within a request
+        if library_id in UNCATALOGUED_LIBRARY_IDS:
+            return cls()
+
+        if area_id not in cls._registry:
+            with cls._registry_lock:
+                if area_id not in cls._registry:
+                    cls._registry[area_id] = cls()
+        return cls._registry[area_id]
+
+    @classmethod
+    def clear(cls):
+        with cls._registry_lock:
+            cls._registry.clear()
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def get(self, name, load):
+        if name not in self._values:
+            with self._lock:
+                if name not in self._values:
+                    self._values[name] = load()
+        return self._values[name]
+
+    def set(self, name, value):
+        with self._lock:
+            self._values.setdefault(name, value)
 
 
 class GetItemByIdMixin:
@@ -48,38 +105,47 @@ class BaseBroadcastArea(ABC):
     def simple_polygons_with_bleed(self) -> Polygons:
         return self.simple_polygons.bleed_by(self.estimated_bleed_in_m)
 
+    @property
+    def estimated_area(self):
+        return self.polygons.estimated_area
+
+    @property
+    def simple_estimated_area(self):
+        return self.simple_polygons.estimated_area
+
+    @property
+    def simple_bounds(self):
+        if not self.polygons:
+            return None
+        return self.simple_polygons.bounds
+
+    @property
+    def centroid(self):
+        return Polygon(self.polygons[0]).centroid
+
     @cached_property
     def phone_density(self):
-        if not self.simple_polygons.estimated_area:
+        if not self.simple_estimated_area:
             return 0
-        return self.count_of_phones / square_metres_to_square_miles(self.simple_polygons.estimated_area)
+        return self.count_of_phones / square_metres_to_square_miles(self.simple_estimated_area)
 
     @property
     def estimated_bleed_in_m(self):
-        """
-        Estimates the amount of bleed based on the population of an
-        area. Higher density areas tend to have short range masts, so
-        the bleed is low (down to 500m). Lower density areas have longer
-        range masts, so the typical bleed will be high (up to 5,000m).
-        """
-        if self.phone_density < 1:
-            return Polygons.approx_bleed_in_m
-        estimated_bleed = 5_900 - (math.log(self.phone_density, 10) * 1_250)
-        return max(500, min(estimated_bleed, 5000))
+        return estimate_bleed_in_m(self.phone_density)
 
-    @cached_property
-    def nearby_electoral_wards(self):
-        # If area has polygons, we identify electoral wards that overlap the polygon bounds
-        if not self.polygons:
+    def nearby_areas(self, library_id=None, area_type=None):
+        # If area has polygons, we identify areas whose bounds overlap the polygon bounds
+        if not self.simple_bounds:
             return []
-        bounds = self.simple_polygons.bounds
-        search_rect = Rect(*bounds)  # Creates rectangle of the polygon bounds
-        overlaps = rtree_index.query(search_rect)  # We only index electoral wards in the RTree
-        electoral_ward_ids = []
-        for overlap in overlaps:
-            electoral_ward_ids.append(overlap.data)  # Extracts overlapping electoral ward ID
+        area_ids = BroadcastAreasRepository().get_area_ids_overlapping_bounds(
+            *self.simple_bounds, library_id=library_id, area_type=area_type
+        )
+        return broadcast_area_libraries.get_areas_with_simple_polygons(area_ids)
 
-        return broadcast_area_libraries.get_areas_with_simple_polygons(electoral_ward_ids)
+    @cached_property
+    def nearby_electoral_wards(self):
+        # Only wards are looked up, so no other polygons are loaded
+        return self.nearby_areas("wd25-lad25-ctyua25", area_type="wd25")
 
 
 class BroadcastArea(BaseBroadcastArea, SortingAndEqualityMixin):
@@ -87,6 +153,7 @@ class BroadcastArea(BaseBroadcastArea, SortingAndEqualityMixin):
 
     def __init__(self, row):
         self.id, self.name, self._count_of_phones, self.library_id = row
+        self._shared = SharedAreaAttributes.for_area(self.id, self.library_id)
 
     @cached_property
     def is_lower_tier_local_authority(self):
@@ -111,50 +178,156 @@ class BroadcastArea(BaseBroadcastArea, SortingAndEqualityMixin):
 
     @cached_property
     def polygons(self):
-        polygons, utm_crs = BroadcastAreasRepository().get_polygons_for_area(self.id)
-        return Polygons(polygons, utm_crs=utm_crs)
+        return polygons_cache.get((self.id, "polygons"), self._load_polygons)
 
     @cached_property
     def simple_polygons(self):
+        return polygons_cache.get((self.id, "simple_polygons"), self._load_simple_polygons)
+
+    def _load_polygons(self):
+        polygons, utm_crs = BroadcastAreasRepository().get_polygons_for_area(self.id)
+        return Polygons(polygons, utm_crs=utm_crs)
+
+    def _load_simple_polygons(self):
         simple_polygons, utm_crs = BroadcastAreasRepository().get_simple_polygons_for_area(self.id)
         return Polygons(simple_polygons, utm_crs=utm_crs).utm_polygons
 
+    def get_simplified_polygons(self, level):
+        # Level 0 is the simple polygons, the rest are coarser versions
+        # of them (see LEVELS_OF_DETAIL_TOLERANCES_IN_M)
+        if level == 0:
+            return self.simple_polygons
+        return polygons_cache.get(
+            (self.id, "simplified_polygons", level), lambda: self._load_simplified_polygons(level)
+        )
+
+    def _load_simplified_polygons(self, level):
+        polygons, utm_crs = BroadcastAreasRepository().get_simplified_polygons_for_area(self.id, level)
+        return Polygons(polygons, utm_crs=utm_crs).utm_polygons
+
+    def get_ward_outline(self, level):
+        # Only local authorities with electoral wards have one. There
+        # are few enough of them to keep every one
+        return self._shared.get(f"ward_outline_{level}", lambda: self._load_ward_outline(level))
+
+    def _load_ward_outline(self, level):
+        ward_outline = BroadcastAreasRepository().get_ward_outline_for_area(self.id, level)
+        if not ward_outline:
+            return None
+        polygons, utm_crs = ward_outline
+        return Polygons(polygons, utm_crs=utm_crs).utm_polygons
+
+    @cached_property
+    def metrics(self):
+        # Worked out when the database was built. Postcodes don’t have
+        # them stored, so the repository returns None and the properties
+        # below work them out from the polygons instead
+        return self._shared.get("metrics", lambda: BroadcastAreasRepository().get_metrics_for_area(self.id))
+
+    @cached_property
+    def estimated_area(self):
+        if self.metrics:
+            return self.metrics.estimated_area
+        return super().estimated_area
+
+    @cached_property
+    def simple_estimated_area(self):
+        if self.metrics:
+            return self.metrics.simple_estimated_area
+        return super().simple_estimated_area
+
+    @cached_property
+    def simple_bounds(self):
+        if self.metrics:
+            return self.metrics.simple_bounds
+        return super().simple_bounds
+
+    @cached_property
+    def centroid(self):
+        if self.metrics and self.metrics.centroid:
+            return Point(*self.metrics.centroid)
+        return super().centroid
+
+    @cached_property
+    def simple_polygons_with_bleed(self):
+        bleed_in_m = self.estimated_bleed_in_m
+
+        # The stored polygons are only used if they were buffered by
+        # exactly this bleed, so that what’s sent doesn’t depend on
+        # whether they were
+        if self.metrics and self.metrics.bleed_in_m == bleed_in_m:
+            return polygons_cache.get(
+                (self.id, "stored_simple_polygons_with_bleed"), self._load_simple_polygons_with_bleed
+            )
+
+        # The bleed depends on the count of phones from the API, so it’s
+        # part of the key rather than being shared unconditionally
+        return polygons_cache.get(
+            (self.id, "simple_polygons_with_bleed", bleed_in_m),
+            lambda: self.simple_polygons.bleed_by(bleed_in_m),
+        )
+
+    def _load_simple_polygons_with_bleed(self):
+        simple_polygons_with_bleed, utm_crs = BroadcastAreasRepository().get_simple_polygons_with_bleed_for_area(
+            self.id
+        )
+        return Polygons(simple_polygons_with_bleed, utm_crs=utm_crs).utm_polygons
+
     @cached_property
     def count_of_phones(self):
         if self.id and self.id.endswith(CITY_OF_LONDON.WARDS):
-            return CITY_OF_LONDON.DAYTIME_POPULATION * (
-                self.polygons.estimated_area / CITY_OF_LONDON.AREA_SQUARE_METRES
-            )
-        if self.simple_polygons.estimated_area:
+            return CITY_OF_LONDON.DAYTIME_POPULATION * (self.estimated_area / CITY_OF_LONDON.AREA_SQUARE_METRES)
+        if self.simple_estimated_area:
             return broadcast_message_api_client.get_count_of_phones(self.as_wkt_geometry)
         else:
             return 0
 
     @cached_property
     def sub_areas(self):
-        return [BroadcastArea(row) for row in BroadcastAreasRepository().get_all_areas_for_group(self.id)]
+        return [
+            BroadcastArea(row)
+            for row in self._shared.get("sub_area_rows", lambda: area_catalogue.get_all_areas_for_group(self.id))
+        ]
+
+    @cached_property
+    def has_sub_areas(self):
+        return area_catalogue.has_sub_areas(self.id)
 
     @cached_property
     def ancestors(self):
-        return list(self._ancestors_iterator)
+        self.prefetch_ancestors([self])
+        return [BroadcastArea(row) for row in self._shared.get("ancestor_rows", self._load_ancestor_rows)]
+
+    def _load_ancestor_rows(self):
+        return area_catalogue.get_ancestors_for_areas([self.id])[self.id]
 
     @cached_property
     def parent(self):
         return next(iter(self.ancestors), None)
 
-    @property
-    def _ancestors_iterator(self):
-        id = self.id
-
-        while True:
-            parent = BroadcastAreasRepository().get_parent_for_area(id)
+    @classmethod
+    def prefetch_ancestors(cls, areas):
+        """
+        Resolves the ancestors of every area in one go, so that a
+        message with lots of wards doesn’t need a lookup per ward per
+        level of the hierarchy.
+        """
+        areas_by_id = {}
+        for area in areas:
+            if isinstance(area, cls) and "ancestor_rows" not in area._shared:
+                areas_by_id.setdefault(area.id, []).append(area)
 
-            if not parent:
-                return
+        if not areas_by_id:
+            return
 
-            parent_broadcast_area = BroadcastArea(parent)
-            yield parent_broadcast_area
-            id = parent_broadcast_area.id
+        for area_id, rows in area_catalogue.get_ancestors_for_areas(list(areas_by_id)).items():
+            # Set on the attributes each area already has, which might
+            # not be the ones registered for its ID any more
+            for area in areas_by_id[area_id]:
+                area._shared.set("ancestor_rows", rows)
+            # The rest of the chain are the ancestors of each ancestor
+            for index, row in enumerate(rows):
+                SharedAreaAttributes.for_area(row[0], row[3]).set("ancestor_rows", rows[index + 1 :])
 
 
 class CustomBroadcastArea(BaseBroadcastArea):
@@ -232,6 +405,11 @@ class BroadcastAreaLibrary(SerialisedModelCollection, SortingAndEqualityMixin, G
 
     __sort_attribute__ = "name"
 
+    # Libraries with more areas than this are listed a page at a time.
+    # Countries and REPPIR sites fit on one page, but flood warning areas
+    # and local authorities don’t
+    areas_per_page = 100
+
     def __init__(self, row):
         id, name, name_singular, is_group = row
         self.id = id
@@ -239,11 +417,15 @@ class BroadcastAreaLibrary(SerialisedModelCollection, SortingAndEqualityMixin, G
         self.name_singular = name_singular
         self.is_group = bool(is_group)
 
+    @cached_property
+    def summary(self):
+        return area_catalogue.get_library_summary(self.id)
+
     def get_examples(self):
         # we show up to four things. three areas, then either a fourth area if there are exactly four, or "and X more".
-        areas_to_show = sorted(area.name for area in self)[:4]
+        areas_to_show = self.summary.example_names
 
-        count_of_areas_not_named = len(self.items) - 3
+        count_of_areas_not_named = self.summary.count_of_areas - 3
         # if there's exactly one area not named, there are exactly four - we should just show all four.
         if count_of_areas_not_named > 1:
             areas_to_show = areas_to_show[:3] + [f"{count_of_areas_not_named} more…"]
@@ -254,37 +436,80 @@ class BroadcastAreaLibrary(SerialisedModelCollection, SortingAndEqualityMixin, G
     def items(self):
         return BroadcastAreasRepository().get_all_areas_for_library(self.id) if self.id != "postcodes" else []
 
-    @cached_property
+    @property
+    def count_of_areas(self):
+        return self.summary.count_of_areas
+
+    @property
+    def is_paginated(self):
+        return self.count_of_areas > self.areas_per_page
+
+    @property
+    def number_of_pages(self):
+        return max(1, math.ceil(self.count_of_areas / self.areas_per_page))
+
+    def get_page(self, page):
+        return [
+            BroadcastArea(row)
+            for row in BroadcastAreasRepository().get_all_areas_for_library(
+                self.id, limit=self.areas_per_page, offset=(page - 1) * self.areas_per_page
+            )
+        ]
+
+    def search(self, search_term, limit=20, with_sub_areas_only=False):
+        return BroadcastAreasRepository().search_areas(
+            self.id, search_term, limit, with_sub_areas_only=with_sub_areas_only
+        )
+
+    @property
     def item_ids(self):
-        item_ids = []
-        item_ids.extend(item[0] for item in self.items)
-        return item_ids
+        return area_catalogue.get_area_ids_for_library(self.id)
 
-    @cached_property
+    @property
     def area_names_ids_lookup(self):
         return (
             # This attribute is only necessary for local authorities currently,
             # we need to be able to get the ID from LA name for LocalAuthorityBulkAreasForm
-            BroadcastAreasRepository().get_all_area_names_and_ids_for_local_authorities()
+            area_catalogue.get_all_area_names_and_ids_for_local_authorities()
             if self.id == "wd25-lad25-ctyua25"  # ID for library storing Electoral Wards and Local Authorities
-            else []
+            else {}
         )
 
+    @property
+    def matcher(self):
+        # Suggests what was meant by lines of the bulk list forms that
+        # don’t match an area in this library
+        if self.id == "wd25-lad25-ctyua25":
+            return area_catalogue.get_local_authority_matcher()
+        if self.id == "Flood_Warning_Target_Areas":
+            return area_catalogue.get_flood_warning_area_matcher()
+        return None
+
 
 class BroadcastAreaLibraries(SerialisedModelCollection, GetItemByIdMixin):
     model = BroadcastAreaLibrary
 
     def __init__(self):
-        self.items = BroadcastAreasRepository().get_libraries()
+        self.items = area_catalogue.get_libraries()
         self.items.append(("coordinates", "Coordinates", "coordinate", 0))
 
     def get_areas(self, area_ids):
-        areas = BroadcastAreasRepository().get_areas(area_ids)
+        areas = area_catalogue.get_areas(area_ids)
         return [BroadcastArea(area) for area in areas]
 
     def get_areas_with_simple_polygons(self, area_ids):
         areas = BroadcastAreasRepository().get_areas_with_simple_polygons(area_ids)
         return [BroadcastArea.from_row_with_simple_polygons(area) for area in areas]
 
+    def get_point_counts_for_levels_of_detail(self, area_ids):
+        return BroadcastAreasRepository().get_point_counts_for_levels_of_detail(area_ids)
+
+    def get_postcode_centroid(self, postcode_area_id):
+        centroid = BroadcastAreasRepository().get_postcode_centroid(postcode_area_id)
+        if not centroid:
+            return None
+        latitude, longitude, _utm_crs = centroid
+        return Point(longitude, latitude)
+
 
 broadcast_area_libraries = BroadcastAreaLibraries()
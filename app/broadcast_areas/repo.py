@@ -1,25 +1,321 @@
+import hashlib
+import itertools
 import json
+import math
 import os
-import pickle
+import re
 import sqlite3
+import struct
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
 from pathlib import Path
 
-rtree_index_path = Path(__file__).parent / "rtree.pickle"
-rtree_index = pickle.loads(rtree_index_path.read_bytes())
+import numpy
+from emergency_alerts_utils.polygons import Polygons
+from shapely import get_parts, union_all
+from shapely.geometry import Polygon
+
+# The areas database doesn’t change for the life of a deploy, so each
+# thread keeps its own long-lived, read-only connection to it rather
+# than paying for a new connection (and a cold page cache) per query
+_read_only_connections = threading.local()
+
+READ_ONLY_MMAP_SIZE_IN_BYTES = 256 * 1024 * 1024
+READ_ONLY_CACHED_STATEMENTS = 256
+
+# How many areas the build scripts insert at once, so that only this many
+# sets of polygons are ever held in memory
+INSERT_BATCH_SIZE = 500
+
+# Secondary indexes, as (name, table and columns). BroadcastAreasRepository.bulk_load
+# drops these while areas are being inserted and creates them again
+# afterwards, which is quicker than keeping them up to date row by row
+INDEXES = (
+    ("broadcast_areas_broadcast_area_library_id", "broadcast_areas (broadcast_area_library_id)"),
+    ("broadcast_areas_broadcast_area_library_group_id", "broadcast_areas (broadcast_area_library_group_id)"),
+    ("broadcast_areas_local_authority_id", "broadcast_areas (local_authority_id)"),
+    ("broadcast_areas_county_id", "broadcast_areas (county_id)"),
+    ("area_ancestors_ancestor_id_depth", "area_ancestors (ancestor_id, depth)"),
+)
+
+# Polygons are stored as a small header, the offset of each ring (in
+# points) and then every coordinate as a little-endian float64. This
+# decodes much faster than JSON because the coordinates can be viewed in
+# place rather than parsed
+PACKED_POLYGONS_HEADER = struct.Struct("<4sI")
+PACKED_POLYGONS_FLOAT64 = b"PLYd"
+
+# The compacted database (see compact-broadcast-areas-db.py) stores each
+# coordinate as a little-endian int32 instead, scaled by the number of
+# decimal places after the header. That’s half the size, and loses
+# nothing because the coordinates are rounded to that many places anyway
+PACKED_POLYGONS_INT32 = b"PLYi"
+PACKED_POLYGONS_DECIMAL_PLACES = struct.Struct("<I")
+
+# Tables which can’t be added to a database built by an older version of
+# the scripts, because they are filled in as areas are inserted rather
+# than by build_indexes. Such a database has to be rebuilt from scratch
+REQUIRED_TABLES = (
+    "broadcast_areas",
+    "broadcast_area_polygons",
+    "broadcast_area_metrics",
+    "area_ancestors",
+    "broadcast_area_names",
+)
+
+# How far, in metres, each level of detail after the simple polygons
+# (level 0) is allowed to move the outline of an area. Showing lots of
+# areas at once uses the coarsest level which is still accurate enough,
+# rather than simplifying them all again at request time
+LEVELS_OF_DETAIL_TOLERANCES_IN_M = (100, 300, 1_000, 3_000)
+
+# The type of an area is the part of its ID before the first hyphen, like
+# `wd25` for electoral wards or `lad25` for local authorities
+AREA_TYPE_SQL = "substr(broadcast_areas.id, 1, instr(broadcast_areas.id, '-') - 1)"
+
+# The same conversion as app.formatters.square_metres_to_square_miles,
+# which the build scripts can’t import
+SQUARE_METRES_TO_SQUARE_MILES = 3.86e-7
+
+AreaMetrics = namedtuple(
+    "AreaMetrics",
+    [
+        "estimated_area",
+        "simple_estimated_area",
+        "simple_bounds",
+        "centroid",
+        "bleed_in_m",
+    ],
+)
+
+# What the build scripts insert for each area. The source hash is from
+# get_source_hash, or None if the feature wasn’t hashed
+AreaToInsert = namedtuple(
+    "AreaToInsert",
+    [
+        "id",
+        "name",
+        "library_id",
+        "group_id",
+        "polygons",
+        "simple_polygons",
+        "utm_crs",
+        "count_of_phones",
+        "source_hash",
+    ],
+)
+
+
+def estimate_bleed_in_m(phone_density):
+    """
+    Estimates the amount of bleed based on the population of an
+    area. Higher density areas tend to have short range masts, so
+    the bleed is low (down to 500m). Lower density areas have longer
+    range masts, so the typical bleed will be high (up to 5,000m).
+    """
+    if phone_density < 1:
+        return Polygons.approx_bleed_in_m
+    estimated_bleed = 5_900 - (math.log(phone_density, 10) * 1_250)
+    return max(500, min(estimated_bleed, 5000))
+
+
+def get_source_hash(feature):
+    """
+    A fingerprint of a GeoJSON feature’s geometry and properties, stored
+    with the polygons made from it so that rebuilding the database can
+    skip features which haven’t changed
+    """
+    source = json.dumps(
+        {"geometry": feature["geometry"], "properties": feature["properties"]},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def pack_polygons(polygons, decimal_places=None):
+    offsets = numpy.cumsum([0] + [len(polygon) for polygon in polygons], dtype="<u4")
+
+    if decimal_places is not None:
+        coordinates = numpy.array([point for polygon in polygons for point in polygon], dtype="<f8")
+        return b"".join(
+            (
+                PACKED_POLYGONS_HEADER.pack(PACKED_POLYGONS_INT32, len(polygons)),
+                PACKED_POLYGONS_DECIMAL_PLACES.pack(decimal_places),
+                offsets.tobytes(),
+                numpy.rint(coordinates * 10**decimal_places).astype("<i4").tobytes(),
+            )
+        )
+
+    # Pad the offsets so the coordinates start on an 8 byte boundary
+    padding = b"\0" * (4 * (len(offsets) % 2))
+    coordinates = numpy.array([point for polygon in polygons for point in polygon], dtype="<f8")
+    return b"".join(
+        (
+            PACKED_POLYGONS_HEADER.pack(PACKED_POLYGONS_FLOAT64, len(polygons)),
+            offsets.tobytes(),
+            padding,
+            coordinates.tobytes(),
+        )
+    )
+
+
+def unpack_rings(value):
+    """
+    Returns each ring as an (n, 2) NumPy array of float64s. These are a
+    view onto `value` rather than a copy of it, unless the coordinates
+    were packed as integers
+    """
+    format_code, number_of_rings = PACKED_POLYGONS_HEADER.unpack_from(value)
+
+    if format_code == PACKED_POLYGONS_INT32:
+        (decimal_places,) = PACKED_POLYGONS_DECIMAL_PLACES.unpack_from(value, PACKED_POLYGONS_HEADER.size)
+        offsets_start = PACKED_POLYGONS_HEADER.size + PACKED_POLYGONS_DECIMAL_PLACES.size
+        offsets = numpy.frombuffer(value, dtype="<u4", count=number_of_rings + 1, offset=offsets_start)
+        coordinates = numpy.frombuffer(value, dtype="<i4", offset=offsets_start + 4 * (number_of_rings + 1))
+        coordinates = (coordinates / 10**decimal_places).reshape(-1, 2)
+        return [coordinates[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    if format_code != PACKED_POLYGONS_FLOAT64:
+        raise ValueError(f"Unknown packed polygons format {format_code!r}")
+
+    offsets = numpy.frombuffer(value, dtype="<u4", count=number_of_rings + 1, offset=PACKED_POLYGONS_HEADER.size)
+    coordinates_start = PACKED_POLYGONS_HEADER.size + 4 * (number_of_rings + 1 + (number_of_rings + 1) % 2)
+    coordinates = numpy.frombuffer(value, dtype="<f8", offset=coordinates_start).reshape(-1, 2)
+
+    return [coordinates[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def unpack_polygons(value):
+    return [ring.tolist() for ring in unpack_rings(value)]
 
 
 class BroadcastAreasRepository(object):
-    def __init__(self):
+    def __init__(self, read_only=True):
         database_name = "broadcast-areas.sqlite3" if not os.environ.get("IN_CICD") else "broadcast-areas-test.sqlite3"
         self.database = Path(__file__).resolve().parent / database_name
+        # The scripts which build the database need to see their own
+        # writes, so they opt out of the pooled, immutable connections
+        self.read_only = read_only
+        self._bulk_load_conn = None
+        self._transaction_conn = None
 
     def conn(self):
+        if self._transaction_conn:
+            return self._transaction_conn
+        if self._bulk_load_conn:
+            return self._bulk_load_conn
         return sqlite3.connect(str(self.database))
 
+    @contextmanager
+    def transaction(self):
+        """
+        For the build scripts to insert everything in a library as one
+        transaction. The inserts inside it share a connection, and are
+        committed together at the end rather than one call at a time
+        """
+        if self._transaction_conn:
+            yield
+            return
+
+        with self.conn() as conn:
+            self._transaction_conn = conn
+            try:
+                yield
+            finally:
+                self._transaction_conn = None
+
+    @contextmanager
+    def _writing(self):
+        # Commits once the write is done, unless it’s part of a
+        # transaction, which commits at the end instead
+        if self._transaction_conn:
+            yield self._transaction_conn
+            return
+
+        with self.conn() as conn:
+            yield conn
+
+    @contextmanager
+    def bulk_load(self):
+        """
+        For the build scripts to insert areas through. Every write shares
+        one connection, with no rollback journal and no waiting for the
+        disk, and the indexes are built once at the end rather than as
+        each row goes in. A build that fails part of the way through
+        leaves an unusable database, so it has to be run again from the
+        start
+        """
+        conn = sqlite3.connect(str(self.database))
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        with conn:
+            self.check_schema(conn)
+            self.add_missing_columns(conn)
+            self.drop_indexes(conn)
+
+        self._bulk_load_conn = conn
+        try:
+            yield
+            with conn:
+                self.create_indexes(conn)
+        finally:
+            self._bulk_load_conn = None
+            conn.close()
+
+    def read_only_conn(self):
+        # Connections can’t be shared with a forked worker process, so
+        # they are pooled per process as well as per thread
+        key = (os.getpid(), str(self.database))
+
+        if not hasattr(_read_only_connections, "connections"):
+            _read_only_connections.connections = {}
+
+        connections = _read_only_connections.connections
+
+        if key not in connections:
+            conn = sqlite3.connect(
+                f"{self.database.as_uri()}?mode=ro&immutable=1",
+                uri=True,
+                cached_statements=READ_ONLY_CACHED_STATEMENTS,
+            )
+            conn.execute(f"PRAGMA mmap_size = {READ_ONLY_MMAP_SIZE_IN_BYTES}")
+            conn.execute("PRAGMA query_only = ON")
+            self.check_schema(conn)
+            connections[key] = conn
+
+        return connections[key]
+
+    def check_schema(self, conn):
+        # Rather than failing part of the way through reading or
+        # building on a database that can’t be brought up to date
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+        if missing_tables := [table for table in REQUIRED_TABLES if table not in tables]:
+            reason = f"it doesn’t have {', '.join(missing_tables)}"
+        elif (
+            # Polygons were stored as JSON before they were packed
+            conn.execute("SELECT typeof(polygons) FROM broadcast_area_polygons LIMIT 1").fetchone()
+            or ("blob",)
+        ) != ("blob",):
+            reason = "its polygons aren’t packed"
+        else:
+            return
+
+        raise RuntimeError(
+            f"{self.database.name} was built by an older version of the scripts, so can’t be used ({reason}). "
+            "Rebuild it by running create-broadcast-areas-db.py without --keep-old-polygons or --incremental"
+        )
+
     def delete_db(self):
         os.remove(str(self.database))
 
     def create_tables(self):
+        # Every table except broadcast_area_polygons is keyed by its
+        # primary key rather than a separate rowid, which saves storing
+        # and looking up the key twice. Rows of polygons are too big for
+        # that to help
         with self.conn() as conn:
             conn.execute("""
             CREATE TABLE broadcast_area_libraries (
@@ -27,14 +323,14 @@ class BroadcastAreasRepository(object):
                 name TEXT NOT NULL,
                 name_singular TEXT NOT NULL,
                 is_group BOOLEAN NOT NULL
-            )""")
+            ) WITHOUT ROWID""")
 
             conn.execute("""
             CREATE TABLE broadcast_area_library_groups (
                 id TEXT PRIMARY KEY,
                 name TEXT NOT NULL,
                 broadcast_area_library_id TEXT NOT NULL
-            )""")
+            ) WITHOUT ROWID""")
 
             conn.execute("""
             CREATE TABLE broadcast_areas (
@@ -44,45 +340,678 @@ class BroadcastAreasRepository(object):
                 broadcast_area_library_group_id TEXT,
                 count_of_phones INTEGER,
 
+                -- denormalised from area_ancestors by build_indexes. each
+                -- is the area itself if it is a local authority/county
+                local_authority_id TEXT,
+                county_id TEXT,
+
                 FOREIGN KEY (broadcast_area_library_id)
                     REFERENCES broadcast_area_libraries(id),
 
                 FOREIGN KEY (broadcast_area_library_group_id)
                     REFERENCES broadcast_area_library_groups(id)
-            )""")
+            ) WITHOUT ROWID""")
 
             conn.execute("""
             CREATE TABLE broadcast_area_polygons (
                 id TEXT PRIMARY KEY,
-                polygons TEXT NOT NULL,
-                simple_polygons TEXT NOT NULL,
-                utm_crs TEXT NOT NULL
+                polygons BLOB NOT NULL,
+                utm_crs TEXT NOT NULL,
+
+                -- empty if they’re the same as the polygons, which
+                -- compact-broadcast-areas-db.py doesn’t store twice
+                simple_polygons BLOB,
+
+                -- the simple polygons buffered by the bleed_in_m in
+                -- broadcast_area_metrics. filled in by build_indexes
+                simple_polygons_with_bleed BLOB,
+
+                -- from get_source_hash, for the feature these polygons
+                -- were made from
+                source_hash TEXT
             )""")
 
+            # Worked out from the polygons by build_indexes, so that
+            # showing an area doesn’t need its polygons projecting. Areas
+            # are in square metres, bounds and centroids in degrees
+            conn.execute("""
+            CREATE TABLE broadcast_area_metrics (
+                id TEXT PRIMARY KEY,
+                estimated_area REAL NOT NULL,
+                simple_estimated_area REAL NOT NULL,
+                simple_min_x REAL,
+                simple_min_y REAL,
+                simple_max_x REAL,
+                simple_max_y REAL,
+                centroid_x REAL,
+                centroid_y REAL,
+
+                -- from the population estimate in broadcast_areas, so
+                -- empty if there isn’t one
+                bleed_in_m REAL,
+
+                -- what the metrics were worked out from, so build_indexes
+                -- only works them out again if either has changed
+                source_hash TEXT,
+                count_of_phones INTEGER
+            ) WITHOUT ROWID""")
+
+            self.create_postcode_centroids_table(conn)
+            self.create_simplified_polygons_table(conn)
+            self.create_ward_outlines_table(conn)
+
             conn.execute("""
-            CREATE INDEX broadcast_areas_broadcast_area_library_id
-            ON broadcast_areas (broadcast_area_library_id);
+            CREATE TABLE area_ancestors (
+                area_id TEXT NOT NULL,
+                ancestor_id TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+
+                PRIMARY KEY (area_id, ancestor_id)
+            ) WITHOUT ROWID""")
+
+            self.create_bounds_tables(conn)
+
+            # Full text search of area names. Populated by build_indexes
+            conn.execute("""
+            CREATE VIRTUAL TABLE broadcast_area_names USING fts5(
+                name,
+                area_id UNINDEXED,
+                broadcast_area_library_id UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )""")
+
+            self.create_indexes(conn)
+
+    @staticmethod
+    def create_indexes(conn):
+        for name, table_and_columns in INDEXES:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table_and_columns}")
+
+    @staticmethod
+    def drop_indexes(conn):
+        for name, _table_and_columns in INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+    @staticmethod
+    def add_missing_columns(conn):
+        # So that a database built before polygons were hashed can be
+        # rebuilt incrementally
+        for table in ("broadcast_area_polygons", "broadcast_area_metrics"):
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if columns and "source_hash" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN source_hash TEXT")
+            if columns and table == "broadcast_area_metrics" and "count_of_phones" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN count_of_phones INTEGER")
+
+    @staticmethod
+    def create_postcode_centroids_table(conn):
+        # Postcode areas are added to an existing database, which might
+        # have been built before this table existed. Looking up a postcode
+        # is the most common way of drawing a custom area, so it needs to
+        # be a single read which doesn’t load any polygons
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS postcode_centroids (
+            id TEXT PRIMARY KEY,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            utm_crs TEXT NOT NULL
+        ) WITHOUT ROWID""")
+
+    @staticmethod
+    def create_bounds_tables(conn):
+        # An R*Tree of the bounding box of every area, so we can find the
+        # areas near a point or custom area without loading every
+        # polygon. Populated by build_indexes.
+        #
+        # As well as x and y, each area is on a layer for its library and
+        # type of area (like electoral wards), so that searching one
+        # library or type only visits the parts of the tree with areas of
+        # that kind. The layers of a library are numbered next to each
+        # other so it can be searched as a range
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_area_bounds_layers (
+            layer INTEGER PRIMARY KEY,
+            broadcast_area_library_id TEXT NOT NULL,
+            area_type TEXT NOT NULL
+        )""")
+
+        conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS broadcast_area_bounds USING rtree(
+            id,
+            min_x, max_x,
+            min_y, max_y,
+            min_layer, max_layer,
+            +area_id TEXT,
+            -- from broadcast_area_polygons, so that build_indexes only
+            -- works out the bounds again if the polygons have changed
+            +source_hash TEXT
+        )""")
+
+    @staticmethod
+    def create_simplified_polygons_table(conn):
+        # Populated by build_indexes, which might be run against a
+        # database built before this table existed
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_area_simplified_polygons (
+            id TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            tolerance_in_m REAL NOT NULL,
+            point_count INTEGER NOT NULL,
+
+            -- empty for level 0, which is the simple polygons in
+            -- broadcast_area_polygons
+            polygons BLOB,
+
+            PRIMARY KEY (id, level)
+        )""")
+
+    @staticmethod
+    def create_ward_outlines_table(conn):
+        # The outline of all the electoral wards in each local authority,
+        # merged into one by build_indexes, at each level of detail
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_area_ward_outlines (
+            id TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            polygons BLOB NOT NULL,
+            utm_crs TEXT NOT NULL,
+
+            PRIMARY KEY (id, level)
+        )""")
+
+    def build_indexes(self):
+        # Run at the end of each build script, once all the areas in the
+        # database have been inserted
+        with self.conn() as conn:
+            # In case the areas weren’t inserted through bulk_load
+            self.create_indexes(conn)
+            self.create_simplified_polygons_table(conn)
+            self.create_ward_outlines_table(conn)
+
+            # The closure table, names and R*Tree are brought up to date
+            # rather than built again, so that an incremental build only
+            # writes the rows for areas which have changed
+            conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS new_area_ancestors (
+                area_id TEXT NOT NULL,
+                ancestor_id TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+
+                PRIMARY KEY (area_id, ancestor_id)
+            ) WITHOUT ROWID""")
+            conn.execute("DELETE FROM new_area_ancestors;")
+
+            # A closure table, so that looking up the parent, children or
+            # full ancestry of an area doesn’t need a self-join at request time
+            conn.execute("""
+            INSERT INTO new_area_ancestors (area_id, ancestor_id, depth)
+            WITH RECURSIVE ancestors (area_id, ancestor_id, depth) AS (
+                SELECT id, broadcast_area_library_group_id, 1
+                FROM broadcast_areas
+                WHERE broadcast_area_library_group_id IS NOT NULL
+
+                UNION ALL
+
+                SELECT ancestors.area_id, broadcast_areas.broadcast_area_library_group_id, ancestors.depth + 1
+                FROM ancestors
+                JOIN broadcast_areas ON broadcast_areas.id = ancestors.ancestor_id
+                WHERE broadcast_areas.broadcast_area_library_group_id IS NOT NULL
+            )
+            SELECT ancestors.area_id, ancestors.ancestor_id, ancestors.depth
+            FROM ancestors
+            JOIN broadcast_areas ON broadcast_areas.id = ancestors.ancestor_id
+            """)
+
+            # A ward which has moved local authority changes the ward
+            # outline of the one it has left as well as the one it has
+            # joined, so both are kept track of before area_ancestors is
+            # changed
+            conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS changed_local_authorities (id TEXT PRIMARY KEY) WITHOUT ROWID"
+            )
+            conn.execute("DELETE FROM changed_local_authorities;")
+
+            for old, new in (("area_ancestors", "new_area_ancestors"), ("new_area_ancestors", "area_ancestors")):
+                conn.execute(f"""
+                INSERT OR IGNORE INTO changed_local_authorities (id)
+                SELECT ancestor_id
+                FROM {old}
+                WHERE
+                    area_id LIKE 'wd25-%'
+                    AND ancestor_id LIKE 'lad25-%'
+                    AND NOT EXISTS (
+                        SELECT 1
+                        FROM {new}
+                        WHERE {new}.area_id = {old}.area_id AND {new}.ancestor_id = {old}.ancestor_id
+                    )
+                """)
+
+            conn.execute("""
+            DELETE FROM area_ancestors
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM new_area_ancestors
+                WHERE
+                    new_area_ancestors.area_id = area_ancestors.area_id
+                    AND new_area_ancestors.ancestor_id = area_ancestors.ancestor_id
+                    AND new_area_ancestors.depth = area_ancestors.depth
+            )
+            """)
+            conn.execute("""
+            INSERT INTO area_ancestors (area_id, ancestor_id, depth)
+            SELECT area_id, ancestor_id, depth FROM new_area_ancestors
+            EXCEPT
+            SELECT area_id, ancestor_id, depth FROM area_ancestors
+            """)
+
+            conn.execute("""
+            UPDATE broadcast_areas
+            SET
+                local_authority_id = CASE WHEN id LIKE 'lad25-%' THEN id ELSE (
+                    SELECT ancestor_id
+                    FROM area_ancestors
+                    WHERE area_id = broadcast_areas.id AND ancestor_id LIKE 'lad25-%'
+                ) END,
+                county_id = CASE WHEN id LIKE 'ctyua25-%' THEN id ELSE (
+                    SELECT ancestor_id
+                    FROM area_ancestors
+                    WHERE area_id = broadcast_areas.id AND ancestor_id LIKE 'ctyua25-%'
+                ) END
             """)
 
+            # There are too many postcodes to list, so they’re only ever
+            # looked up by the postcode itself
             conn.execute("""
-            CREATE INDEX broadcast_areas_broadcast_area_library_group_id
-            ON broadcast_areas (broadcast_area_library_group_id);
+            DELETE FROM broadcast_area_names
+            WHERE rowid IN (
+                SELECT broadcast_area_names.rowid
+                FROM broadcast_area_names
+                LEFT JOIN broadcast_areas ON broadcast_areas.id = broadcast_area_names.area_id
+                WHERE
+                    broadcast_areas.id IS NULL
+                    OR broadcast_areas.name IS NOT broadcast_area_names.name
+                    OR broadcast_areas.broadcast_area_library_id IS NOT broadcast_area_names.broadcast_area_library_id
+            )
             """)
+            conn.execute("""
+            INSERT INTO broadcast_area_names (name, area_id, broadcast_area_library_id)
+            SELECT name, id, broadcast_area_library_id
+            FROM broadcast_areas
+            WHERE
+                broadcast_area_library_id != 'postcodes'
+                AND id NOT IN (SELECT area_id FROM broadcast_area_names)
+            """)
+
+            self._update_bounds(conn)
+
+            # Groups don’t have their own population estimate, so use the
+            # total of everything in them. Metrics are only worked out for
+            # areas whose polygons or population estimate have changed
+            # since they were last stored. Only their IDs are held on to,
+            # so that the polygons can be read a row at a time. Postcodes
+            # are too small for metrics to be worth storing, so they’re
+            # worked out at request time
+            conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS changed_areas (
+                id TEXT PRIMARY KEY,
+                count_of_phones INTEGER
+            ) WITHOUT ROWID""")
+            conn.execute("DELETE FROM changed_areas;")
+            conn.execute("""
+            INSERT INTO changed_areas (id, count_of_phones)
+            WITH areas AS (
+                SELECT
+                    broadcast_areas.id,
+                    broadcast_areas.broadcast_area_library_id,
+                    COALESCE(broadcast_areas.count_of_phones, (
+                        SELECT SUM(descendants.count_of_phones)
+                        FROM area_ancestors
+                        JOIN broadcast_areas AS descendants ON descendants.id = area_ancestors.area_id
+                        WHERE area_ancestors.ancestor_id = broadcast_areas.id
+                    )) AS count_of_phones
+                FROM broadcast_areas
+            )
+            SELECT areas.id, areas.count_of_phones
+            FROM areas
+            JOIN broadcast_area_polygons ON broadcast_area_polygons.id = areas.id
+            LEFT JOIN broadcast_area_metrics ON broadcast_area_metrics.id = areas.id
+            WHERE
+                areas.broadcast_area_library_id != 'postcodes'
+                AND (
+                    broadcast_area_metrics.id IS NULL
+                    OR broadcast_area_metrics.source_hash IS NOT broadcast_area_polygons.source_hash
+                    OR broadcast_area_metrics.count_of_phones IS NOT areas.count_of_phones
+                )
+            """)
+
+            areas = conn.execute("""
+            SELECT
+                changed_areas.id,
+                changed_areas.count_of_phones,
+                polygons,
+                COALESCE(simple_polygons, polygons),
+                utm_crs,
+                source_hash
+            FROM changed_areas
+            JOIN broadcast_area_polygons ON broadcast_area_polygons.id = changed_areas.id
+            """)
+
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO broadcast_area_metrics (
+                    id,
+                    estimated_area, simple_estimated_area,
+                    simple_min_x, simple_min_y, simple_max_x, simple_max_y,
+                    centroid_x, centroid_y,
+                    bleed_in_m,
+                    source_hash, count_of_phones
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    (
+                        area_id,
+                        *self._get_metrics(count_of_phones, polygons, simple_polygons, utm_crs),
+                        source_hash,
+                        count_of_phones,
+                    )
+                    for area_id, count_of_phones, polygons, simple_polygons, utm_crs, source_hash in areas
+                ),
+            )
+
+            # The bleed comes from the metrics, so needs working out again
+            # for the same areas
+            conn.execute("""
+            UPDATE broadcast_area_polygons
+            SET simple_polygons_with_bleed = NULL
+            WHERE id IN (SELECT id FROM changed_areas)
+            """)
+            conn.execute("DELETE FROM broadcast_area_simplified_polygons WHERE id IN (SELECT id FROM changed_areas)")
+            conn.execute("""
+            DELETE FROM broadcast_area_ward_outlines
+            WHERE
+                id IN (SELECT id FROM changed_local_authorities)
+                OR id IN (
+                    SELECT local_authority_id
+                    FROM broadcast_areas
+                    WHERE id IN (SELECT id FROM changed_areas)
+                )
+            """)
+
+            areas = conn.execute("""
+            SELECT broadcast_area_polygons.id, bleed_in_m, COALESCE(simple_polygons, polygons), utm_crs
+            FROM broadcast_area_metrics
+            JOIN broadcast_area_polygons ON broadcast_area_polygons.id = broadcast_area_metrics.id
+            JOIN broadcast_areas ON broadcast_areas.id = broadcast_area_metrics.id
+            WHERE
+                broadcast_area_library_id != 'postcodes'
+                AND bleed_in_m IS NOT NULL
+                AND simple_polygons_with_bleed IS NULL
+            """)
+
+            conn.executemany(
+                "UPDATE broadcast_area_polygons SET simple_polygons_with_bleed = ? WHERE id = ?",
+                (
+                    (self._get_simple_polygons_with_bleed(bleed_in_m, simple_polygons, utm_crs), area_id)
+                    for area_id, bleed_in_m, simple_polygons, utm_crs in areas
+                ),
+            )
+
+            # There are too many postcodes to pick between, and they’re
+            # only ever shown one at a time
+            areas = conn.execute("""
+            SELECT broadcast_area_polygons.id, COALESCE(simple_polygons, polygons), utm_crs
+            FROM broadcast_area_polygons
+            JOIN broadcast_areas ON broadcast_areas.id = broadcast_area_polygons.id
+            WHERE
+                broadcast_area_library_id != 'postcodes'
+                AND broadcast_area_polygons.id NOT IN (SELECT id FROM broadcast_area_simplified_polygons)
+            """)
+
+            conn.executemany(
+                """
+                INSERT INTO broadcast_area_simplified_polygons (id, level, tolerance_in_m, point_count, polygons)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (
+                    (area_id, *level_of_detail)
+                    for area_id, simple_polygons, utm_crs in areas
+                    for level_of_detail in self._get_levels_of_detail(simple_polygons, utm_crs)
+                ),
+            )
+
+            local_authority_ids = conn.execute("""
+            SELECT DISTINCT local_authority_id
+            FROM broadcast_areas
+            WHERE
+                id LIKE 'wd25-%'
+                AND local_authority_id IS NOT NULL
+                AND local_authority_id NOT IN (SELECT id FROM broadcast_area_ward_outlines)
+            """).fetchall()
+
+            conn.executemany(
+                "INSERT INTO broadcast_area_ward_outlines (id, level, polygons, utm_crs) VALUES (?, ?, ?, ?)",
+                (
+                    (local_authority_id, *ward_outline)
+                    for (local_authority_id,) in local_authority_ids
+                    for ward_outline in self._get_ward_outlines(conn, local_authority_id)
+                ),
+            )
+
+    def _update_bounds(self, conn):
+        # Layers are numbered in order of library and type of area. If one
+        # has been added or taken away since the R*Tree was built, or it
+        # was built before it stored source hashes, every area has to go
+        # back in
+        conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS new_bounds_layers (
+            layer INTEGER PRIMARY KEY,
+            broadcast_area_library_id TEXT NOT NULL,
+            area_type TEXT NOT NULL
+        )""")
+        conn.execute("DELETE FROM new_bounds_layers;")
+        conn.execute(f"""
+        INSERT INTO new_bounds_layers (layer, broadcast_area_library_id, area_type)
+        SELECT
+            ROW_NUMBER() OVER (ORDER BY broadcast_area_library_id, area_type),
+            broadcast_area_library_id,
+            area_type
+        FROM (SELECT DISTINCT broadcast_area_library_id, {AREA_TYPE_SQL} AS area_type FROM broadcast_areas)
+        """)
+
+        self.create_bounds_tables(conn)
+        (layers_have_changed,) = conn.execute("""
+        SELECT
+            EXISTS (SELECT * FROM broadcast_area_bounds_layers EXCEPT SELECT * FROM new_bounds_layers)
+            OR EXISTS (SELECT * FROM new_bounds_layers EXCEPT SELECT * FROM broadcast_area_bounds_layers)
+        """).fetchone()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(broadcast_area_bounds)")}
+
+        if layers_have_changed or "source_hash" not in columns:
+            conn.execute("DROP TABLE broadcast_area_bounds;")
+            conn.execute("DROP TABLE broadcast_area_bounds_layers;")
+            self.create_bounds_tables(conn)
+            conn.execute("INSERT INTO broadcast_area_bounds_layers SELECT * FROM new_bounds_layers")
+
+        # Otherwise only the areas which have gone, moved layer or have
+        # different polygons are taken out. Polygons without a source
+        # hash can’t be compared, so are always taken out
+        conn.execute(f"""
+        DELETE FROM broadcast_area_bounds
+        WHERE id IN (
+            SELECT broadcast_area_bounds.id
+            FROM broadcast_area_bounds
+            LEFT JOIN broadcast_areas ON broadcast_areas.id = broadcast_area_bounds.area_id
+            LEFT JOIN broadcast_area_polygons ON broadcast_area_polygons.id = broadcast_area_bounds.area_id
+            LEFT JOIN broadcast_area_bounds_layers ON
+                broadcast_area_bounds_layers.broadcast_area_library_id = broadcast_areas.broadcast_area_library_id
+                AND broadcast_area_bounds_layers.area_type = {AREA_TYPE_SQL}
+            WHERE
+                broadcast_area_polygons.source_hash IS NULL
+                OR broadcast_area_polygons.source_hash IS NOT broadcast_area_bounds.source_hash
+                OR broadcast_area_bounds_layers.layer IS NOT broadcast_area_bounds.min_layer
+        )
+        """)
+
+        polygons = conn.execute(f"""
+        SELECT broadcast_areas.id, layer, polygons, source_hash
+        FROM broadcast_areas
+        JOIN broadcast_area_polygons ON broadcast_area_polygons.id = broadcast_areas.id
+        JOIN broadcast_area_bounds_layers ON
+            broadcast_area_bounds_layers.broadcast_area_library_id = broadcast_areas.broadcast_area_library_id
+            AND broadcast_area_bounds_layers.area_type = {AREA_TYPE_SQL}
+        WHERE broadcast_areas.id NOT IN (SELECT area_id FROM broadcast_area_bounds)
+        """)
+
+        conn.executemany(
+            """
+            INSERT INTO broadcast_area_bounds (area_id, min_x, max_x, min_y, max_y, min_layer, max_layer, source_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                (area_id, *bounds, layer, layer, source_hash)
+                for area_id, layer, area_polygons, source_hash in polygons
+                # Areas without any polygons can’t be found by location
+                if (bounds := self._get_bounds(unpack_rings(area_polygons)))
+            ),
+        )
+
+    @staticmethod
+    def _get_bounds(rings):
+        # In the order the R*Tree expects, rather than (min_x, min_y, max_x, max_y).
+        # An area with no polygons doesn’t have any bounds
+        if not rings:
+            return None
+        coordinates = numpy.concatenate(rings)
+        return (
+            float(coordinates[:, 0].min()),
+            float(coordinates[:, 0].max()),
+            float(coordinates[:, 1].min()),
+            float(coordinates[:, 1].max()),
+        )
+
+    @staticmethod
+    def _get_metrics(count_of_phones, polygons, simple_polygons, utm_crs):
+        polygons = unpack_polygons(polygons)
+        simple_polygons = unpack_polygons(simple_polygons)
+
+        # Worked out the same way as BroadcastArea does at request time,
+        # where only the simple polygons are converted to UTM
+        estimated_area = Polygons(polygons, utm_crs=utm_crs).estimated_area
+        simple_estimated_area = Polygons(simple_polygons, utm_crs=utm_crs).utm_polygons.estimated_area
+
+        if simple_polygons:
+            simple_min_x, simple_max_x, simple_min_y, simple_max_y = BroadcastAreasRepository._get_bounds(
+                [numpy.array(ring) for ring in simple_polygons]
+            )
+        else:
+            simple_min_x = simple_max_x = simple_min_y = simple_max_y = None
+
+        if polygons:
+            centroid = Polygon(polygons[0]).centroid
+            centroid_x, centroid_y = centroid.x, centroid.y
+        else:
+            centroid_x = centroid_y = None
+
+        if count_of_phones is None:
+            bleed_in_m = None
+        elif simple_estimated_area:
+            bleed_in_m = estimate_bleed_in_m(count_of_phones / (simple_estimated_area * SQUARE_METRES_TO_SQUARE_MILES))
+        else:
+            bleed_in_m = estimate_bleed_in_m(0)
+
+        return (
+            estimated_area,
+            simple_estimated_area,
+            simple_min_x,
+            simple_min_y,
+            simple_max_x,
+            simple_max_y,
+            centroid_x,
+            centroid_y,
+            bleed_in_m,
+        )
+
+    @staticmethod
+    def _get_simple_polygons_with_bleed(bleed_in_m, simple_polygons, utm_crs):
+        # Buffered the same way as BroadcastArea.simple_polygons_with_bleed
+        polygons = Polygons(unpack_polygons(simple_polygons), utm_crs=utm_crs).utm_polygons
+        return pack_polygons(polygons.bleed_by(bleed_in_m).as_coordinate_pairs_long_lat)
+
+    @staticmethod
+    def _get_levels_of_detail(simple_polygons, utm_crs):
+        yield 0, 0, sum(len(ring) for ring in unpack_rings(simple_polygons)), None
+
+        polygons = Polygons(unpack_polygons(simple_polygons), utm_crs=utm_crs).utm_polygons
+
+        for level, tolerance_in_m in enumerate(LEVELS_OF_DETAIL_TOLERANCES_IN_M, start=1):
+            # Buffering by the tolerance before simplifying means the
+            # outline still covers the whole area, so no one who should
+            # get the alert is left out. Parts which end up touching are
+            # merged, which saves yet more points
+            outline = union_all([polygon.buffer(tolerance_in_m) for polygon in polygons])
+            rings = Polygons(
+                [Polygon(part.exterior).simplify(tolerance_in_m) for part in get_parts(outline)],
+                utm_crs=polygons.utm_crs,
+            ).as_coordinate_pairs_long_lat
+            yield level, tolerance_in_m, sum(len(ring) for ring in rings), pack_polygons(rings)
+
+    @staticmethod
+    def _get_ward_outlines(conn, local_authority_id):
+        rows = conn.execute(
+            """
+            SELECT polygons
+            FROM broadcast_areas
+            JOIN broadcast_area_polygons ON broadcast_area_polygons.id = broadcast_areas.id
+            WHERE broadcast_areas.id LIKE 'wd25-%' AND local_authority_id = ?
+            """,
+            (local_authority_id,),
+        )
+
+        # Wards share their borders exactly, so merging the full
+        # polygons leaves only the borders of the local authority, which
+        # are then simplified the same way as any other area
+        outline = union_all([Polygon(ring) for (polygons,) in rows for ring in unpack_rings(polygons)])
+        simplified = Polygons([list(part.exterior.coords) for part in get_parts(outline)]).smooth.simplify
+        simple_polygons = pack_polygons(simplified.as_coordinate_pairs_long_lat)
+
+        # Then made coarser the same way as the levels of detail of the
+        # wards, so it can stand in for them at any level
+        yield 0, simple_polygons, simplified.utm_crs
+
+        for level, _tolerance_in_m, _point_count, polygons in itertools.islice(
+            BroadcastAreasRepository._get_levels_of_detail(simple_polygons, simplified.utm_crs), 1, None
+        ):
+            yield level, polygons, simplified.utm_crs
 
     def delete_library_data(self):
-        # delete everything except broadcast_area_polygons
-        with self.conn() as conn:
+        # delete everything except broadcast_area_polygons, and the
+        # tables worked out from them and the areas (like the metrics and
+        # area_ancestors), which build_indexes brings up to date
+        with self._writing() as conn:
+            self.check_schema(conn)
             conn.execute("DELETE FROM broadcast_area_libraries;")
             conn.execute("DELETE FROM broadcast_area_library_groups;")
             conn.execute("DELETE FROM broadcast_areas;")
 
+    def delete_library(self, library_id):
+        # For scripts which add one library to an existing database.
+        # Like delete_library_data, keeps the polygons and the tables
+        # which build_indexes brings up to date
+        with self._writing() as conn:
+            self.check_schema(conn)
+            conn.execute("DELETE FROM broadcast_areas WHERE broadcast_area_library_id = ?", (library_id,))
+            conn.execute("DELETE FROM broadcast_area_library_groups WHERE broadcast_area_library_id = ?", (library_id,))
+            conn.execute("DELETE FROM broadcast_area_libraries WHERE id = ?", (library_id,))
+
     def insert_broadcast_area_library(self, id, *, name, name_singular, is_group):
         q = """
         INSERT INTO broadcast_area_libraries (id, name, name_singular, is_group)
         VALUES (?, ?, ?, ?)
         """
 
-        with self.conn() as conn:
+        with self._writing() as conn:
             conn.execute(q, (id, name, name_singular, is_group))
 
     def insert_broadcast_areas(self, areas, keep_old_features):
@@ -95,25 +1024,77 @@ class BroadcastAreasRepository(object):
         VALUES (?, ?, ?, ?, ?)
         """
 
+        # Replaces any polygons kept from an earlier build
         features_q = """
-        INSERT INTO broadcast_area_polygons (
+        INSERT OR REPLACE INTO broadcast_area_polygons (
             id,
-            polygons, simple_polygons, utm_crs
+            polygons, simple_polygons, utm_crs,
+            source_hash
         )
-        VALUES (?, ?, ?, ?)
+        VALUES (?, ?, ?, ?, ?)
         """
 
-        with self.conn() as conn:
-            for id, name, area_id, group, polygons, simple_polygons, utm_crs, count_of_phones in areas:
-                conn.execute(areas_q, (id, name, area_id, group, count_of_phones))
+        # Each area is a list in the order of AreaToInsert. Areas whose
+        # polygons are None keep the ones already stored. `areas` can be a
+        # generator, which is consumed a batch at a time
+        areas_to_insert = iter(areas)
+
+        # All the areas go in as one transaction, or as part of the one
+        # for their library
+        with self._writing() as conn:
+            while batch := [AreaToInsert(*area) for area in itertools.islice(areas_to_insert, INSERT_BATCH_SIZE)]:
+                conn.executemany(
+                    areas_q,
+                    ((area.id, area.name, area.library_id, area.group_id, area.count_of_phones) for area in batch),
+                )
                 if not keep_old_features:
-                    conn.execute(features_q, (id, json.dumps(polygons), json.dumps(simple_polygons), utm_crs))
+                    conn.executemany(
+                        features_q,
+                        (
+                            (
+                                area.id,
+                                pack_polygons(area.polygons),
+                                pack_polygons(area.simple_polygons),
+                                area.utm_crs,
+                                area.source_hash,
+                            )
+                            for area in batch
+                            if area.polygons is not None
+                        ),
+                    )
+
+    def insert_postcode_centroids(self, centroids):
+        q = """
+        INSERT OR REPLACE INTO postcode_centroids (id, latitude, longitude, utm_crs)
+        VALUES (?, ?, ?, ?)
+        """
+
+        with self._writing() as conn:
+            self.create_postcode_centroids_table(conn)
+            conn.executemany(q, centroids)
 
     def query(self, sql, *args):
-        with self.conn() as conn:
-            cursor = conn.cursor()
-            cursor.execute(sql, (*args,))
-            return cursor.fetchall()
+        if self.read_only:
+            return self.read_only_conn().execute(sql, (*args,)).fetchall()
+
+        # Not in a transaction of its own, which would commit the areas
+        # being inserted by bulk_load part of the way through
+        cursor = self.conn().cursor()
+        cursor.execute(sql, (*args,))
+        return cursor.fetchall()
+
+    def get_source_hashes(self):
+        # There are millions of postcodes, so their hashes are looked up
+        # one at a time instead (see get_source_hash_for_area)
+        return dict(self.query("""
+            SELECT id, source_hash
+            FROM broadcast_area_polygons
+            WHERE source_hash IS NOT NULL AND id NOT LIKE 'postcodes-%'
+            """))
+
+    def get_source_hash_for_area(self, area_id):
+        results = self.query("SELECT source_hash FROM broadcast_area_polygons WHERE id = ?", area_id)
+        return results[0][0] if results else None
 
     def get_libraries(self):
         q = "SELECT id, name, name_singular, is_group FROM broadcast_area_libraries"
@@ -136,7 +1117,13 @@ class BroadcastAreasRepository(object):
 
     def get_areas_with_simple_polygons(self, area_ids):
         q = """
-        SELECT broadcast_areas.id, name, count_of_phones, broadcast_area_library_id, simple_polygons, utm_crs
+        SELECT
+            broadcast_areas.id,
+            name,
+            count_of_phones,
+            broadcast_area_library_id,
+            COALESCE(simple_polygons, polygons),
+            utm_crs
         FROM broadcast_areas
         JOIN broadcast_area_polygons on broadcast_area_polygons.id = broadcast_areas.id
         WHERE broadcast_areas.id IN ({})
@@ -144,11 +1131,11 @@ class BroadcastAreasRepository(object):
 
         results = self.query(q, *area_ids)
 
-        areas = [(row[0], row[1], row[2], row[3], json.loads(row[4]), row[5]) for row in results]
+        areas = [(row[0], row[1], row[2], row[3], unpack_polygons(row[4]), row[5]) for row in results]
 
         return areas
 
-    def get_all_areas_for_library(self, library_id):
+    def _library_areas_condition(self, library_id):
         is_multi_tier_library = self.query(
             """
         SELECT exists(
@@ -164,25 +1151,30 @@ class BroadcastAreasRepository(object):
         if is_multi_tier_library and library_id != "REPPIR_DEPZ_sites":
             # only interested in areas with children - eg local authorities, counties, unitary authorities. not wards.
             # Not including REPPIR sites as both parent LA & child sites not in same library
-            q = """
-            SELECT id, name, count_of_phones, broadcast_area_library_id
-            FROM broadcast_areas
-            JOIN (
-                SELECT DISTINCT broadcast_area_library_group_id
-                FROM broadcast_areas
-                WHERE broadcast_area_library_group_id IS NOT NULL
-            ) AS parent_broadcast_areas ON parent_broadcast_areas.broadcast_area_library_group_id = broadcast_areas.id
-            WHERE broadcast_area_library_id = ?
-            """
-        else:
-            # Countries don't have any children, so the above query wouldn't return anything.
-            q = """
-            SELECT id, name, count_of_phones, broadcast_area_library_id
-            FROM broadcast_areas
-            WHERE broadcast_area_library_id = ?
+            return """
+            broadcast_area_library_id = ? AND EXISTS (
+                SELECT 1
+                FROM area_ancestors
+                WHERE ancestor_id = broadcast_areas.id AND depth = 1
+            )
             """
 
-        results = self.query(q, library_id)
+        # Countries don't have any children, so the above query wouldn't return anything.
+        return "broadcast_area_library_id = ?"
+
+    def get_all_areas_for_library(self, library_id, limit=None, offset=0):
+        q = """
+        SELECT id, name, count_of_phones, broadcast_area_library_id
+        FROM broadcast_areas
+        WHERE {}
+        """.format(self._library_areas_condition(library_id))
+
+        if limit is None:
+            results = self.query(q, library_id)
+        else:
+            # Ordered the same way as sorting the areas by name, with the
+            # ID to make the order stable from one page to the next
+            results = self.query(q + "ORDER BY LOWER(name), id LIMIT ? OFFSET ?", library_id, limit, offset)
 
         return [(row[0], row[1], row[2], row[3]) for row in results]
 
@@ -217,12 +1209,9 @@ class BroadcastAreasRepository(object):
     def get_parent_for_area(self, area_id):
         q = """
         SELECT id, name, count_of_phones, broadcast_area_library_id
-        FROM broadcast_areas
-        WHERE id IN (
-            SELECT broadcast_area_library_group_id
-            FROM broadcast_areas
-            WHERE id = ?
-        )
+        FROM area_ancestors
+        JOIN broadcast_areas ON broadcast_areas.id = area_ancestors.ancestor_id
+        WHERE area_id = ? AND depth = 1
         """
 
         results = self.query(q, area_id)
@@ -232,6 +1221,63 @@ class BroadcastAreasRepository(object):
 
         return (results[0][0], results[0][1], results[0][2], results[0][3])
 
+    def get_ancestors_for_areas(self, area_ids):
+        q = """
+        SELECT area_id, id, name, count_of_phones, broadcast_area_library_id
+        FROM area_ancestors
+        JOIN broadcast_areas ON broadcast_areas.id = area_ancestors.ancestor_id
+        WHERE area_id IN ({})
+        ORDER BY area_id, depth
+        """.format(",".join("?" * len(area_ids)))
+
+        results = self.query(q, *area_ids)
+
+        ancestors = {area_id: [] for area_id in area_ids}
+        for row in results:
+            ancestors[row[0]].append((row[1], row[2], row[3], row[4]))
+
+        return ancestors
+
+    def _get_layers(self, library_id, area_type):
+        # The first and last layer with areas of this library and type.
+        # If there aren’t any the range is empty, so nothing matches
+        q = """
+        SELECT COALESCE(MIN(layer), 0), COALESCE(MAX(layer), -1)
+        FROM broadcast_area_bounds_layers
+        WHERE (? IS NULL OR broadcast_area_library_id = ?) AND (? IS NULL OR area_type = ?)
+        """
+
+        return self.query(q, library_id, library_id, area_type, area_type)[0]
+
+    def get_area_ids_overlapping_bounds(self, min_x, min_y, max_x, max_y, library_id=None, area_type=None):
+        """
+        `area_type` is the part of an area ID before the first hyphen,
+        like `wd25` for electoral wards. Boxes that only touch at an
+        edge count as overlapping, the same as for a point on an edge.
+        These are candidates based on bounding boxes, so callers still
+        need to check the polygons themselves
+        """
+        first_layer, last_layer = self._get_layers(library_id, area_type)
+
+        q = """
+        SELECT area_id
+        FROM broadcast_area_bounds
+        WHERE min_x <= ? AND max_x >= ? AND min_y <= ? AND max_y >= ? AND min_layer <= ? AND max_layer >= ?
+        """
+
+        return [row[0] for row in self.query(q, max_x, min_x, max_y, min_y, last_layer, first_layer)]
+
+    def get_area_ids_containing_point(self, x, y, library_id=None, area_type=None):
+        first_layer, last_layer = self._get_layers(library_id, area_type)
+
+        q = """
+        SELECT area_id
+        FROM broadcast_area_bounds
+        WHERE min_x <= ? AND max_x >= ? AND min_y <= ? AND max_y >= ? AND min_layer <= ? AND max_layer >= ?
+        """
+
+        return [row[0] for row in self.query(q, x, x, y, y, last_layer, first_layer)]
+
     def get_polygons_for_area(self, area_id):
         q = """
         SELECT polygons, utm_crs
@@ -241,15 +1287,147 @@ class BroadcastAreasRepository(object):
 
         results = self.query(q, area_id)
 
-        return json.loads(results[0][0]), results[0][1]
+        return unpack_polygons(results[0][0]), results[0][1]
 
     def get_simple_polygons_for_area(self, area_id):
         q = """
-        SELECT simple_polygons, utm_crs
+        SELECT COALESCE(simple_polygons, polygons), utm_crs
         FROM broadcast_area_polygons
         WHERE id = ?
         """
 
         results = self.query(q, area_id)
 
-        return json.loads(results[0][0]), results[0][1]
+        return unpack_polygons(results[0][0]), results[0][1]
+
+    def get_point_counts_for_levels_of_detail(self, area_ids):
+        """
+        Returns the tolerance and total number of points of each level
+        of detail which every one of `area_ids` has
+        """
+        area_ids = set(area_ids)
+
+        q = """
+        SELECT level, MAX(tolerance_in_m), SUM(point_count)
+        FROM broadcast_area_simplified_polygons
+        WHERE id IN ({})
+        GROUP BY level
+        HAVING COUNT(*) = ?
+        """.format(",".join("?" * len(area_ids)))
+
+        results = self.query(q, *area_ids, len(area_ids))
+
+        return {level: (tolerance_in_m, point_count) for level, tolerance_in_m, point_count in results}
+
+    def get_simplified_polygons_for_area(self, area_id, level):
+        q = """
+        SELECT broadcast_area_simplified_polygons.polygons, utm_crs
+        FROM broadcast_area_simplified_polygons
+        JOIN broadcast_area_polygons ON broadcast_area_polygons.id = broadcast_area_simplified_polygons.id
+        WHERE broadcast_area_simplified_polygons.id = ? AND level = ?
+        """
+
+        results = self.query(q, area_id, level)
+
+        return unpack_polygons(results[0][0]), results[0][1]
+
+    def get_ward_outline_for_area(self, area_id, level):
+        q = """
+        SELECT polygons, utm_crs
+        FROM broadcast_area_ward_outlines
+        WHERE id = ? AND level = ?
+        """
+
+        results = self.query(q, area_id, level)
+
+        if not results:
+            return None
+
+        return unpack_polygons(results[0][0]), results[0][1]
+
+    def get_metrics_for_area(self, area_id):
+        q = """
+        SELECT
+            estimated_area, simple_estimated_area,
+            simple_min_x, simple_min_y, simple_max_x, simple_max_y,
+            centroid_x, centroid_y,
+            bleed_in_m
+        FROM broadcast_area_metrics
+        WHERE id = ?
+        """
+
+        results = self.query(q, area_id)
+
+        if not results:
+            return None
+
+        row = results[0]
+
+        return AreaMetrics(
+            estimated_area=row[0],
+            simple_estimated_area=row[1],
+            simple_bounds=None if row[2] is None else (row[2], row[3], row[4], row[5]),
+            centroid=None if row[6] is None else (row[6], row[7]),
+            bleed_in_m=row[8],
+        )
+
+    def get_simple_polygons_with_bleed_for_area(self, area_id):
+        q = """
+        SELECT simple_polygons_with_bleed, utm_crs
+        FROM broadcast_area_polygons
+        WHERE id = ? AND simple_polygons_with_bleed IS NOT NULL
+        """
+
+        results = self.query(q, area_id)
+
+        if not results:
+            return None
+
+        return unpack_polygons(results[0][0]), results[0][1]
+
+    def get_postcode_centroid(self, area_id):
+        q = """
+        SELECT latitude, longitude, utm_crs
+        FROM postcode_centroids
+        WHERE id = ?
+        """
+
+        results = self.query(q, area_id)
+
+        if not results:
+            return None
+
+        return results[0][0], results[0][1], results[0][2]
+
+    def search_areas(self, library_id, search_term, limit, with_sub_areas_only=False):
+        # Every word has to match the start of a word in the name, so
+        # “new tyn” finds “Newcastle upon Tyne”
+        words = re.findall(r"\w+", search_term)
+
+        if not words:
+            return []
+
+        q = """
+        SELECT broadcast_areas.id, broadcast_areas.name, parents.name
+        FROM broadcast_area_names
+        JOIN broadcast_areas ON broadcast_areas.id = broadcast_area_names.area_id
+        LEFT JOIN broadcast_areas AS parents ON parents.id = broadcast_areas.broadcast_area_library_group_id
+        WHERE broadcast_area_names MATCH ? AND broadcast_area_names.broadcast_area_library_id = ? {}
+        ORDER BY broadcast_area_names.rank, broadcast_areas.name
+        LIMIT ?
+        """.format(
+            # The same areas which are listed for a library with sub-areas
+            """
+            AND EXISTS (
+                SELECT 1
+                FROM area_ancestors
+                WHERE ancestor_id = broadcast_areas.id AND depth = 1
+            )
+            """
+            if with_sub_areas_only
+            else ""
+        )
+
+        results = self.query(q, " ".join(f'"{word}"*' for word in words), library_id, limit)
+
+        return [(row[0], row[1], row[2]) for row in results]
@@ -0,0 +1,97 @@
+import json
+
+import geojson
+
+# How much of the file to read at a time. A feature bigger than this
+# (like the coastline of a country) is read in ever bigger pieces until
+# it can be decoded
+READ_SIZE = 1024 * 1024
+
+WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    def __init__(self, file):
+        self.file = file
+        self.buffer = ""
+        self.position = 0
+        # The same as geojson.loads, so features come out exactly as they
+        # would from reading the whole file (including the coordinates
+        # being rounded)
+        self.decoder = json.JSONDecoder(object_hook=geojson.GeoJSON.to_instance)
+
+    def read_more(self, size=READ_SIZE):
+        # Drop everything that’s already been decoded, so the buffer only
+        # ever holds the feature being decoded and what’s after it
+        self.buffer = self.buffer[self.position :]
+        self.position = 0
+
+        chunk = self.file.read(size)
+        self.buffer += chunk
+        return bool(chunk)
+
+    def skip(self, characters=WHITESPACE):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in characters:
+                self.position += 1
+            if self.position < len(self.buffer) or not self.read_more():
+                return
+
+    def expect(self, character):
+        self.skip()
+        if self.position >= len(self.buffer) or self.buffer[self.position] != character:
+            raise ValueError(f"Expected {character!r} at position {self.position} of the buffer")
+        self.position += 1
+
+    def peek(self):
+        self.skip()
+        return self.buffer[self.position] if self.position < len(self.buffer) else None
+
+    def decode(self):
+        self.skip()
+        size = READ_SIZE
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # Most likely the value carries on past the end of the
+                # buffer. Reading double what was read last time means a
+                # big value is only decoded a handful of times
+                if not self.read_more(size):
+                    raise
+                size *= 2
+                continue
+
+            # A number or keyword right at the end of the buffer might
+            # carry on in the part of the file that hasn’t been read yet
+            if end == len(self.buffer) and self.read_more(size):
+                continue
+
+            self.position = end
+            return value
+
+
+def iter_features(path):
+    """
+    Yields the features of a GeoJSON FeatureCollection one at a time, as
+    they are read from the file, so only one feature needs to be held in
+    memory rather than the whole collection
+    """
+    with open(path, encoding="utf-8-sig") as file:
+        reader = _Reader(file)
+        reader.expect("{")
+
+        while reader.peek() != "}":
+            key = reader.decode()
+            reader.expect(":")
+
+            if key != "features":
+                reader.decode()
+            else:
+                reader.expect("[")
+                while reader.peek() != "]":
+                    yield reader.decode()
+                    reader.skip(WHITESPACE + ",")
+                reader.expect("]")
+
+            reader.skip(WHITESPACE + ",")
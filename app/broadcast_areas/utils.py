@@ -1,13 +1,36 @@
 import itertools
+import math
 from collections import defaultdict
 
 from emergency_alerts_utils.polygons import Polygons
+from shapely import get_parts, union_all
 
-from app.broadcast_areas.models import CustomBroadcastArea
+from app.broadcast_areas.models import (
+    BroadcastArea,
+    CustomBroadcastArea,
+    broadcast_area_libraries,
+)
+
+# Roughly how many pixels across the map of a broadcast’s areas is. The
+# map is zoomed to fit the areas, so a level of detail which moves their
+# outlines by less than their extent divided by this looks the same
+MAP_SIZE_IN_PIXELS = 600
+
+# A coarser level of detail can be drawn to keep within the point
+# budget, but never one which moves the outlines by more pixels than this
+MAX_MAP_ERROR_IN_PIXELS = 3
+
+# How many points the polygons drawn on the map of a broadcast’s areas
+# can have, between all of them
+POINT_BUDGET_PER_AREA = 250
+MAX_POINT_BUDGET = 2_500
+
+APPROX_METRES_TO_DEGREE = 111_320
 
 
 def aggregate_areas(areas):
     areas = _convert_custom_areas_to_wards(areas)
+    BroadcastArea.prefetch_ancestors(areas)
     areas = _aggregate_wards_by_local_authority(areas)
     areas = _aggregate_lower_tier_authorities(areas)
     return sorted(areas)
@@ -94,7 +117,135 @@ def create_areas_dict(areas):
 
 
 def get_polygons_from_areas(areas, area_attribute):
-    areas_polygons = [getattr(area, area_attribute) for area in areas]
+    polygons = _combine_polygons([getattr(area, area_attribute) for area in areas])
+
+    if area_attribute != "polygons" and len(areas) > 1:
+        # We’re combining simplified polygons from multiple areas so we
+        # need to re-simplify the combined polygons to keep the point
+        # count down
+        return polygons.smooth.simplify
+    return polygons
+
+
+def get_map_polygons_from_areas(areas):
+    """
+    The polygons to draw on a map of `areas`. A single area is drawn in
+    full. More than one are drawn at the coarsest level of detail which
+    looks the same at the size the map is drawn, or a coarser one if
+    that’s needed for their merged polygons to fit in the point budget.
+    Only for showing on a map, never for what a broadcast is sent to
+    """
+    if len(areas) < 2 or not _are_library_areas(areas):
+        return get_polygons_from_areas(areas, area_attribute="polygons")
+
+    budget = min(len(areas) * POINT_BUDGET_PER_AREA, MAX_POINT_BUDGET)
+    polygons_at_each_level = (
+        _combine_polygons(list(_get_polygons_with_wards_merged(areas, level)))
+        for level in get_levels_of_detail_to_try(areas)
+    )
+    polygons = next(polygons_at_each_level)
+
+    if polygons.point_count > budget:
+        # If nothing coarser fits either, the level which looks the same
+        # is drawn anyway
+        polygons = next((coarser for coarser in polygons_at_each_level if coarser.point_count <= budget), polygons)
+
+    return polygons
+
+
+def _are_library_areas(areas):
+    # Custom areas don’t have levels of detail, or wards to merge
+    return all(type(area) is BroadcastArea for area in areas)
+
+
+def get_levels_of_detail_to_try(areas):
+    return choose_levels_of_detail(
+        {
+            level: tolerance_in_m
+            for level, (tolerance_in_m, _point_count) in broadcast_area_libraries.get_point_counts_for_levels_of_detail(
+                [area.id for area in areas]
+            ).items()
+        },
+        extent_in_m=_get_extent_in_m([area.simple_bounds for area in areas if area.simple_bounds]),
+    )
+
+
+def choose_levels_of_detail(tolerances_in_m, *, extent_in_m):
+    """
+    Picks from `tolerances_in_m`, a dictionary of the tolerance of each
+    level of detail, the levels to try drawing a map at, in order. The
+    first is the coarsest level which looks the same on the map. The rest
+    are coarser levels to use if it doesn’t fit in the point budget, but
+    never one which would visibly move the outlines
+    """
+    metres_per_pixel = extent_in_m / MAP_SIZE_IN_PIXELS
+
+    level = max((level for level in tolerances_in_m if tolerances_in_m[level] <= metres_per_pixel), default=0)
+
+    return [level] + [
+        coarser_level
+        for coarser_level in sorted(tolerances_in_m)
+        if coarser_level > level and tolerances_in_m[coarser_level] <= MAX_MAP_ERROR_IN_PIXELS * metres_per_pixel
+    ]
+
+
+def _get_polygons_with_wards_merged(areas, level):
+    """
+    Yields the polygons of each area at `level`, except for electoral
+    wards, which are merged with the other wards picked in the same local
+    authority so that the borders between them don’t take up any points.
+    If every ward in a local authority is picked, its outline is used.
+    Only for drawing on a map, because the outline is made from the full
+    polygons of the wards rather than their simple polygons
+    """
+    BroadcastArea.prefetch_ancestors(areas)
+    wards_by_local_authority = defaultdict(list)
+
+    for area in areas:
+        if area.is_electoral_ward and area.parent:
+            wards_by_local_authority[area.parent].append(area)
+        else:
+            yield area.get_simplified_polygons(level)
+
+    for local_authority, wards in wards_by_local_authority.items():
+        ward_ids = {ward.id for ward in wards}
+
+        if all(ward.id in ward_ids for ward in local_authority.sub_areas) and (
+            ward_outline := local_authority.get_ward_outline(level)
+        ):
+            yield ward_outline
+        else:
+            yield from union_polygons([ward.get_simplified_polygons(level) for ward in wards])
+
+
+def union_polygons(areas_polygons):
+    """
+    Merges overlapping and neighbouring polygons, yielding one `Polygons`
+    for each coordinate reference system they are in
+    """
+    polygons_by_crs = defaultdict(list)
+
+    for polygons in areas_polygons:
+        polygons_by_crs[polygons.utm_crs].extend(polygons)
+
+    for utm_crs, polygons in polygons_by_crs.items():
+        yield Polygons(list(get_parts(union_all(polygons))), utm_crs=utm_crs)
+
+
+def _get_extent_in_m(bounds):
+    if not bounds:
+        return 0
+
+    min_xs, min_ys, max_xs, max_ys = zip(*bounds)
+    latitude = (min(min_ys) + max(max_ys)) / 2
+
+    return APPROX_METRES_TO_DEGREE * max(
+        (max(max_xs) - min(min_xs)) * math.cos(math.radians(latitude)),
+        max(max_ys) - min(min_ys),
+    )
+
+
+def _combine_polygons(areas_polygons):
     coordinate_reference_systems = {polygons.utm_crs for polygons in areas_polygons}
 
     if len(coordinate_reference_systems) == 1:
@@ -114,9 +265,4 @@ def get_polygons_from_areas(areas, area_attribute):
             list(itertools.chain(*(area_polygon.as_wgs84_coordinates for area_polygon in areas_polygons)))
         )
 
-    if area_attribute != "polygons" and len(areas) > 1:
-        # We’re combining simplified polygons from multiple areas so we
-        # need to re-simplify the combined polygons to keep the point
-        # count down
-        return polygons.smooth.simplify
     return polygons
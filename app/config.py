@@ -113,6 +113,11 @@ class Config(object):
         "operator": 900,
     }  # Default alert durations for live, training or operator
 
+    # Memory each worker can use to keep decoded area polygons between requests
+    BROADCAST_AREA_POLYGONS_CACHE_SIZE_IN_BYTES = (
+        int(os.environ.get("BROADCAST_AREA_POLYGONS_CACHE_SIZE_IN_MB", "128")) * 1024 * 1024
+    )
+
     ESTIMATED_PHONE_COUNTS = {
         "lower_bound": 900_000,
         "upper_bound": 1_000_000,
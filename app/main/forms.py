@@ -6,7 +6,7 @@ from numbers import Number
 
 import pytz
 from emergency_alerts_utils.admin_action import ADMIN_SENSITIVE_PERMISSIONS
-from emergency_alerts_utils.formatters import strip_all_whitespace
+from emergency_alerts_utils.formatters import formatted_list, strip_all_whitespace
 from emergency_alerts_utils.insensitive_dict import InsensitiveDict
 from emergency_alerts_utils.validation import InvalidPhoneError, validate_phone_number
 from flask import request
@@ -543,6 +543,7 @@ class GovukTextareaBulkField(GovukTextareaField):
         library_ids=None,
         item,
         area_id_parser,
+        matcher=None,
         maximum=25,
         **kwargs,
     ):
@@ -555,6 +556,9 @@ class GovukTextareaBulkField(GovukTextareaField):
         # How we refer to a singular area i.e. Local Authority
         self.item = item
 
+        # Suggests what was meant by values that aren’t in the library
+        self.matcher = matcher
+
         # Maximum number of areas allowed in the list
         self.max = maximum
 
@@ -576,10 +580,20 @@ class GovukTextareaBulkField(GovukTextareaField):
             return
 
         # Comparing input areas with those in library
-        for id_, area_id in zip(ids, area_ids):
-            if area_id not in self.library_ids:
-                # error code specified determines form-level validation error message
-                self.error_code = "invalid"
+        invalid_ids = [id_ for id_, area_id in zip(ids, area_ids) if area_id not in self.library_ids]
+        if not invalid_ids:
+            return
+
+        # error code specified determines form-level validation error message
+        self.error_code = "invalid"
+        suggestions = self.matcher.suggest_for_all(invalid_ids) if self.matcher else {}
+        for id_ in invalid_ids:
+            if suggestions.get(id_):
+                self.errors.append(
+                    f"{self.item} '{id_}' not found. Did you mean "
+                    f"{formatted_list(suggestions[id_], conjunction='or', before_each='', after_each='')}?"
+                )
+            else:
                 self.errors.append(f"{self.item} '{id_}' not found")
 
     def _check_ids_provided_are_unique(self, form, ids):
@@ -1986,9 +2000,10 @@ class FloodWarningForm(StripWhitespaceForm):
 
 class FloodWarningBulkAreasForm(StripWhitespaceForm):
 
-    def __init__(self, library_ids, *args, **kwargs):
+    def __init__(self, library_ids, *args, matcher=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.areas.library_ids = set(library_ids)
+        self.areas.library_ids = frozenset(library_ids)
+        self.areas.matcher = matcher
         self.areas.area_id_parser = self._parse_ids
         if not hasattr(self, "form_errors"):
             self.form_errors = []
@@ -2022,9 +2037,10 @@ class FloodWarningBulkAreasForm(StripWhitespaceForm):
 
 class LocalAuthorityBulkAreasForm(StripWhitespaceForm):
 
-    def __init__(self, library_ids, *args, **kwargs):
+    def __init__(self, library_ids, *args, matcher=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.areas.library_lookup_dict = library_ids
+        self.areas.matcher = matcher
         self.areas.library_ids = set(library_ids.values())
         self.areas.area_id_parser = self._parse_ids
         if not hasattr(self, "form_errors"):
@@ -1,4 +1,4 @@
-from flask import abort, flash, redirect, render_template, request, url_for
+from flask import abort, flash, jsonify, redirect, render_template, request, url_for
 from notifications_python_client.errors import HTTPError
 
 from app.broadcast_areas.models import CustomBroadcastAreas
@@ -176,25 +176,36 @@ def choose_area(
         url = ".search_flood_warning_areas"
         return redirect_for_library_page(url, service_id, message_type, message_id, template_folder_id)
 
+    page = _get_library_page_number(library)
+
     if library.is_group:
         return render_template(
             "views/broadcast/areas-with-sub-areas.html",
             search_form=SearchByNameForm(),
-            show_search_form=(len(library) > 7),
+            show_search_form=(library.count_of_areas > 7),
+            search_url=_get_library_search_url(library, service_id, message_type),
             library=library,
+            areas=library.get_page(page) if library.is_paginated else sorted(library),
+            **_get_library_page_links(library, page, service_id, message_id, message_type, template_folder_id),
             page_title=f"Choose a {library.name_singular.lower()}",
             message=message,
             message_type=message_type,
             template_folder_id=template_folder_id,
         )
 
-    form = BroadcastAreaForm.from_library(library)
-    if form.validate_on_submit():
+    if library.is_paginated:
+        form, selected_area_ids = _get_paginated_broadcast_area_form(library, page)
+    else:
+        form, selected_area_ids = BroadcastAreaForm.from_library(library), []
+
+    if "go_to_page" not in request.form and form.validate_on_submit():
         if message:
-            message.replace_areas([*form.areas.data])
+            message.replace_areas([*selected_area_ids, *form.areas.data])
         else:
             message = Message.create_from_area(
-                service_id=service_id, area_ids=[*form.areas.data], template_folder_id=template_folder_id
+                service_id=service_id,
+                area_ids=[*selected_area_ids, *form.areas.data],
+                template_folder_id=template_folder_id,
             )
         return redirect(
             url_for(
@@ -208,8 +219,11 @@ def choose_area(
     return render_template(
         "views/broadcast/areas.html",
         form=form,
+        selected_area_ids=selected_area_ids,
+        **_get_library_page_links(library, page, service_id, message_id, message_type, template_folder_id),
         search_form=SearchByNameForm(),
-        show_search_form=(len(form.areas.choices) > 7),
+        show_search_form=(library.is_paginated or len(form.areas.choices) > 7),
+        search_url=_get_library_search_url(library, service_id, message_type),
         page_title=(
             f"Choose {library.name[0].lower()}{library.name[1:]}"
             if library.name != "REPPIR DEPZ sites"
@@ -228,6 +242,102 @@ def choose_area(
     )
 
 
+def _get_library_page_number(library):
+    page = request.args.get("page", 1, type=int)
+    return min(max(page, 1), library.number_of_pages)
+
+
+def _get_library_page_links(library, page, service_id, message_id, message_type, template_folder_id):
+    if not library.is_paginated:
+        return {"previous_page": None, "next_page": None}
+
+    def page_link(page_number, title):
+        return {
+            "url": url_for(
+                ".choose_area",
+                service_id=service_id,
+                message_id=message_id,
+                message_type=message_type,
+                library_slug=library.id,
+                template_folder_id=template_folder_id,
+                page=page_number,
+            ),
+            "page": page_number,
+            "title": title,
+            "label": f"page {page_number} of {library.number_of_pages}",
+        }
+
+    return {
+        "previous_page": page_link(page - 1, "Previous page") if page > 1 else None,
+        "next_page": page_link(page + 1, "Next page") if page < library.number_of_pages else None,
+    }
+
+
+def _get_library_search_url(library, service_id, message_type):
+    # The live search can only filter the areas on the page, so for a
+    # library split across pages it searches the whole library instead
+    if not library.is_paginated:
+        return None
+
+    return url_for(
+        ".search_library_areas",
+        service_id=service_id,
+        message_type=message_type,
+        library_slug=library.id,
+        with_sub_areas_only="1" if library.is_group else None,
+    )
+
+
+def _get_paginated_broadcast_area_form(library, page):
+    """
+    Areas chosen on other pages are posted back in hidden fields, so the
+    choices are kept when moving between pages. Moving to another page
+    posts the form to the URL of that page.
+    """
+    form = BroadcastAreaForm.from_library(library.get_page(page))
+    area_ids_on_page = [area_id for area_id, _name in form.areas.choices]
+
+    posted_area_ids = request.form.getlist("selected_areas")
+    if "go_to_page" in request.form:
+        posted_area_ids += request.form.getlist("areas")
+
+    selected_area_ids = {
+        area.id for area in BroadcastMessage.libraries.get_areas(posted_area_ids) if area.library_id == library.id
+    }
+
+    if "go_to_page" in request.form:
+        form.areas.data = [area_id for area_id in area_ids_on_page if area_id in selected_area_ids]
+
+    return form, sorted(selected_area_ids - set(area_ids_on_page))
+
+
+@main.route("/services/<uuid:service_id>/<message_type>/libraries/<library_slug>/search.json")
+@service_has_permission("broadcast")
+@user_has_any_permissions(["create_broadcasts", "manage_templates"], restrict_admin_usage=True)
+def search_library_areas(service_id, message_type, library_slug):
+    if not has_permission_for_message_type(service_id=service_id, message_type=message_type):
+        return abort(403)
+
+    try:
+        library = BroadcastMessage.libraries.get(library_slug)
+    except KeyError:
+        abort(404)
+
+    return jsonify(
+        {
+            "areas": [
+                {"id": id, "name": name, "parent": parent_name}
+                for id, name, parent_name in library.search(
+                    request.args.get("q", ""),
+                    # Libraries with sub-areas only list the areas which
+                    # have them, so that’s all their live search looks for
+                    with_sub_areas_only=request.args.get("with_sub_areas_only") == "1",
+                )
+            ]
+        }
+    )
+
+
 @main.route(
     "/services/<uuid:service_id>/<message_type>/<uuid:message_id>/libraries/<library_slug>/<area_slug>",  # noqa: E501
     methods=["GET", "POST"],
@@ -247,7 +357,7 @@ def choose_sub_area(service_id, message_type, library_slug, area_slug, message_i
     message = Message.from_id_or_403(message_id, service_id=service_id) if message_id else None
     area = BroadcastMessage.libraries.get_areas([area_slug])[0]
     back_link = _get_broadcast_sub_area_back_link(service_id, message_id, library_slug, message_type)
-    is_county = any(sub_area.sub_areas for sub_area in area.sub_areas)
+    is_county = any(sub_area.has_sub_areas for sub_area in area.sub_areas)
 
     form = BroadcastAreaFormWithSelectAll.from_library(
         [] if is_county else area.sub_areas,
@@ -664,7 +774,7 @@ def search_flood_warning_areas_as_a_list(service_id, message_type, message_id=No
     message = Message.from_id_or_403(message_id, service_id=service_id) if message_id else None
     library = BroadcastMessage.libraries.get("Flood_Warning_Target_Areas")
 
-    form = FloodWarningBulkAreasForm(library_ids=library.item_ids)
+    form = FloodWarningBulkAreasForm(library_ids=library.item_ids, matcher=library.matcher)
 
     if form.validate_on_submit():
         ids = split_text_by_comma_and_newline(form.areas.data)
@@ -717,7 +827,7 @@ def search_local_authority_areas_as_a_list(service_id, message_type, message_id=
     message = Message.from_id_or_403(message_id, service_id=service_id) if message_id else None
     library = BroadcastMessage.libraries.get("wd25-lad25-ctyua25")
 
-    form = LocalAuthorityBulkAreasForm(library_ids=library.area_names_ids_lookup)
+    form = LocalAuthorityBulkAreasForm(library_ids=library.area_names_ids_lookup, matcher=library.matcher)
 
     if form.validate_on_submit():
         ids = split_text_by_newline(form.areas.data)
@@ -3,19 +3,21 @@ from ordered_set import OrderedSet
 from werkzeug.utils import cached_property
 
 from app.broadcast_areas.models import (
+    BroadcastArea,
     CustomBroadcastAreas,
     broadcast_area_libraries,
 )
 from app.broadcast_areas.utils import (
     aggregate_areas,
     generate_aggregate_names,
+    get_map_polygons_from_areas,
     get_polygons_from_areas,
 )
 from app.models import JSONModel
 
 ESTIMATED_AREA_OF_LARGEST_UK_COUNTY = broadcast_area_libraries.get_areas(["lad25-E06000065"])[  # North Yorkshire
     0
-].polygons.estimated_area
+].estimated_area
 
 
 class BaseBroadcast(JSONModel):
@@ -66,6 +68,7 @@ class BaseBroadcast(JSONModel):
 
     @property
     def _ancestor_areas_iterator(self):
+        BroadcastArea.prefetch_ancestors(self.areas)
         for area in self.areas:
             for ancestor in area.ancestors:
                 yield ancestor
@@ -92,6 +95,10 @@ class BaseBroadcast(JSONModel):
     def simple_polygons_with_bleed(self):
         return get_polygons_from_areas(self.areas, area_attribute="simple_polygons_with_bleed")
 
+    @cached_property
+    def map_polygons(self):
+        return get_map_polygons_from_areas(self.areas)
+
     @cached_property
     def count_of_phones(self):
         return sum(area.count_of_phones for area in self.areas)
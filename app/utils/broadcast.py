@@ -137,14 +137,12 @@ def create_postcode_db_id(form):
 
 
 def create_custom_area_polygon(form: PostcodeForm, postcode):
-    centroid = None
     circle_polygon = None
     radius = float(form.data["radius"]) if form.data["radius"] else 0
-    try:
-        area = BroadcastMessage.libraries.get_areas([postcode])[0]
-        centroid = get_centroid(area)
+    centroid = BroadcastMessage.libraries.get_postcode_centroid(postcode)
+    if centroid:
         circle_polygon = create_circle(centroid, radius * 1000)
-    except IndexError:
+    else:
         form.postcode.process_errors.append("Enter a postcode within the UK")
     return centroid, circle_polygon
 
@@ -156,8 +154,7 @@ def create_postcode_area_slug(form):
 
 
 def get_centroid(area):
-    polygons = area.polygons[0]
-    return Polygon(polygons).centroid
+    return area.centroid
 
 
 def create_circle(center, radius):
@@ -320,12 +317,10 @@ def adding_invalid_coords_errors_to_form(coordinate_type, form):
 
 
 def get_centroid_if_postcode_in_db(postcode, form):
-    try:
-        area = BroadcastMessage.libraries.get_areas([postcode])[0]
-    except IndexError:
+    centroid = BroadcastMessage.libraries.get_postcode_centroid(postcode)
+    if not centroid:
         form.postcode.process_errors.append("Enter a postcode within the UK")
-    else:
-        return get_centroid(area)
+    return centroid
 
 
 def format_area_name(area_name):
@@ -1,14 +1,27 @@
+import sqlite3
 from math import isclose
 
 import pytest
+from emergency_alerts_utils.polygons import Polygons
+from shapely import MultiPolygon, Polygon
 
+from app.broadcast_areas.catalogue import AreaCatalogue
 from app.broadcast_areas.models import (
+    BroadcastArea,
+    BroadcastAreaLibraries,
     BroadcastAreasRepository,
+    SharedAreaAttributes,
     broadcast_area_libraries,
+    polygons_cache,
 )
 from app.broadcast_areas.populations import (
     estimate_number_of_smartphones_for_population,
 )
+from app.broadcast_areas.repo import (
+    pack_polygons,
+    unpack_polygons,
+    unpack_rings,
+)
 
 
 def close_enough(a, b):
@@ -321,3 +334,228 @@ def test_estimated_bleed(area, expected_bleed_in_m, count_of_phones, mocker):
         broadcast_area_libraries.get_areas([area])[0].estimated_bleed_in_m,
         expected_bleed_in_m,
     )
+
+
+@pytest.mark.parametrize(
+    "difference_in_bleed_in_m, expected_buffers",
+    (
+        (0, 0),
+        (0.001, 1),
+        (100, 1),
+    ),
+)
+def test_simple_polygons_with_bleed_uses_stored_polygons_only_if_bleed_is_the_same(
+    difference_in_bleed_in_m,
+    expected_buffers,
+    mocker,
+):
+    polygons_cache.clear()
+    area = broadcast_area_libraries.get_areas(["wd25-E05014163"])[0]  # Ramsbottom
+    mocker.patch.object(
+        BroadcastArea,
+        "estimated_bleed_in_m",
+        new_callable=mocker.PropertyMock,
+        return_value=area.metrics.bleed_in_m + difference_in_bleed_in_m,
+    )
+    bleed_by_mock = mocker.spy(Polygons, "bleed_by")
+
+    assert area.simple_polygons_with_bleed.estimated_area > area.simple_polygons.estimated_area
+    assert bleed_by_mock.call_count == expected_buffers
+
+
+def test_repository_reuses_read_only_connection():
+    repo = BroadcastAreasRepository()
+
+    assert repo.read_only_conn() is BroadcastAreasRepository().read_only_conn()
+
+    with pytest.raises(sqlite3.OperationalError):
+        repo.read_only_conn().execute("DELETE FROM broadcast_areas")
+
+
+def test_ancestors_for_many_areas_resolved_in_one_query(mocker):
+    SharedAreaAttributes.clear()
+    areas = broadcast_area_libraries.get_areas(
+        [
+            "wd25-E05015706",  # Benhall, the Reddings & Fiddler's Green, Cheltenham
+            "wd25-E05009372",  # Hackney Central, Hackney
+        ]
+    )
+    get_ancestors_mock = mocker.spy(AreaCatalogue, "get_ancestors_for_areas")
+    query_mock = mocker.spy(BroadcastAreasRepository, "query")
+
+    BroadcastArea.prefetch_ancestors(areas)
+
+    assert {area.name: [ancestor.name for ancestor in area.ancestors] for area in areas} == {
+        "Benhall, the Reddings & Fiddler's Green": ["Cheltenham", "Gloucestershire"],
+        "Hackney Central": ["Hackney"],
+    }
+    benhall = next(area for area in areas if area.id == "wd25-E05015706")
+    assert benhall.parent.parent.name == "Gloucestershire"
+    assert get_ancestors_mock.call_count == 1
+    assert query_mock.call_count == 0
+
+
+def test_ancestors_are_found_for_areas_made_before_shared_attributes_were_cleared():
+    area = broadcast_area_libraries.get_areas(["wd25-E05009372"])[0]  # Hackney Central, Hackney
+    SharedAreaAttributes.clear()
+
+    BroadcastArea.prefetch_ancestors([area])
+
+    assert [ancestor.name for ancestor in area.ancestors] == ["Hackney"]
+
+
+def test_postcode_areas_dont_share_attributes_between_requests():
+    SharedAreaAttributes.clear()
+
+    first_request_area = BroadcastArea(("postcodes-BD1", "BD1", None, "postcodes"))
+    second_request_area = BroadcastArea(("postcodes-BD1", "BD1", None, "postcodes"))
+
+    assert first_request_area._shared is not second_request_area._shared
+    assert SharedAreaAttributes._registry == {}
+
+
+def test_areas_with_the_same_id_share_attributes_from_the_database(mocker):
+    SharedAreaAttributes.clear()
+    get_sub_areas_mock = mocker.spy(AreaCatalogue, "get_all_areas_for_group")
+
+    first_request_area = broadcast_area_libraries.get_areas(["ctyua25-E10000013"])[0]  # Gloucestershire
+    second_request_area = broadcast_area_libraries.get_areas(["ctyua25-E10000013"])[0]
+
+    assert first_request_area is not second_request_area
+    assert first_request_area._shared is second_request_area._shared
+    assert [area.id for area in first_request_area.sub_areas] == [area.id for area in second_request_area.sub_areas]
+    assert get_sub_areas_mock.call_count == 1
+
+    # Anything which comes from the API stays with the area it was asked for
+    first_request_area.count_of_phones = 1
+    assert "count_of_phones" not in second_request_area.__dict__
+
+
+@pytest.mark.parametrize(
+    "area_id",
+    (
+        "ctry19-E92000001",
+        "lad25-E09000019",  # Islington
+        "wd25-E05009300",  # Cordwainer, City of London
+    ),
+)
+def test_area_metrics_are_read_from_the_database(area_id):
+    area = broadcast_area_libraries.get_areas([area_id])[0]
+
+    assert area.metrics is not None
+    assert area.estimated_area == pytest.approx(area.polygons.estimated_area)
+    assert area.simple_estimated_area == pytest.approx(area.simple_polygons.estimated_area)
+    simple_polygons, _utm_crs = BroadcastAreasRepository().get_simple_polygons_for_area(area_id)
+    assert area.simple_bounds == pytest.approx(MultiPolygon([Polygon(ring) for ring in simple_polygons]).bounds)
+    assert area.centroid.equals(Polygon(area.polygons[0]).centroid)
+
+
+@pytest.mark.parametrize(
+    "tables, expected_reason",
+    (
+        # Before the closure table, metrics or full text search
+        (
+            ("broadcast_areas (id TEXT PRIMARY KEY)", "broadcast_area_polygons (id TEXT PRIMARY KEY, polygons TEXT)"),
+            "it doesn’t have broadcast_area_metrics, area_ancestors, broadcast_area_names",
+        ),
+        # Before polygons were packed
+        (
+            (
+                "broadcast_areas (id TEXT PRIMARY KEY)",
+                "broadcast_area_polygons (id TEXT PRIMARY KEY, polygons TEXT)",
+                "broadcast_area_metrics (id TEXT PRIMARY KEY)",
+                "area_ancestors (area_id TEXT)",
+                "broadcast_area_names (name TEXT)",
+            ),
+            "its polygons aren’t packed",
+        ),
+    ),
+)
+def test_a_database_built_by_older_scripts_has_to_be_rebuilt(tmp_path, tables, expected_reason):
+    repo = BroadcastAreasRepository()
+    repo.database = tmp_path / "broadcast-areas.sqlite3"
+    with sqlite3.connect(str(repo.database)) as conn:
+        for table in tables:
+            conn.execute(f"CREATE TABLE {table}")
+        conn.execute("INSERT INTO broadcast_area_polygons (id, polygons) VALUES ('ctry19-E92000001', '[[[1, 2]]]')")
+    conn.close()
+
+    with pytest.raises(RuntimeError) as exception:
+        repo.get_metrics_for_area("ctry19-E92000001")
+
+    assert expected_reason in str(exception.value)
+    assert "Rebuild it by running create-broadcast-areas-db.py" in str(exception.value)
+
+
+@pytest.mark.parametrize(
+    "library_id, expected_area_ids",
+    (
+        ("ctry19", {"ctry19-E92000001", "ctry19-W92000004"}),  # England’s bounding box includes Cardiff
+        ("REPPIR_DEPZ_sites", set()),
+    ),
+)
+def test_spatial_index_finds_candidate_areas_for_any_library(library_id, expected_area_ids):
+    cardiff = (-3.1791, 51.4816)
+
+    assert set(BroadcastAreasRepository().get_area_ids_containing_point(*cardiff, library_id=library_id)) == (
+        expected_area_ids
+    )
+
+
+def test_spatial_index_finds_candidate_areas_of_one_type():
+    cardiff = (-3.1791, 51.4816)
+
+    area_ids = BroadcastAreasRepository().get_area_ids_containing_point(
+        *cardiff, library_id="wd25-lad25-ctyua25", area_type="wd25"
+    )
+
+    assert area_ids
+    assert all(area_id.startswith("wd25-") for area_id in area_ids)
+
+
+@pytest.mark.parametrize(
+    "polygons",
+    (
+        [[[-2.03436, 55.81108], [-2.0, 55.8], [-2.1, 55.7], [-2.03436, 55.81108]]],
+        [[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]], [[5.5, 5.5], [6.5, 5.5], [6.5, 6.5], [5.5, 5.5]]],
+        [],
+    ),
+)
+@pytest.mark.parametrize("decimal_places", (None, 6))
+def test_packed_polygons_round_trip(polygons, decimal_places):
+    packed = pack_polygons(polygons, decimal_places=decimal_places)
+
+    assert isinstance(packed, bytes)
+    assert unpack_polygons(packed) == polygons
+    assert [ring.shape for ring in unpack_rings(packed)] == [(len(ring), 2) for ring in polygons]
+
+
+def test_packing_polygons_as_integers_makes_them_smaller():
+    polygons = [[[-2.034361, 55.811083], [-2.0, 55.8], [-2.1, 55.7], [-2.034361, 55.811083]]]
+
+    assert len(pack_polygons(polygons, decimal_places=6)) < len(pack_polygons(polygons))
+    assert unpack_polygons(pack_polygons(polygons, decimal_places=6)) == polygons
+
+
+def test_examples_dont_query_the_database(mocker):
+    libraries = BroadcastAreaLibraries()
+    query_mock = mocker.spy(BroadcastAreasRepository, "query")
+
+    assert [library.get_examples() for library in libraries]
+    assert query_mock.call_count == 0
+
+
+@pytest.mark.parametrize(
+    "area_id, expected_is_county",
+    (
+        ("ctyua25-E10000016", True),  # Kent
+        ("lad25-E09000012", False),  # Hackney
+    ),
+)
+def test_county_structure_is_known_without_querying_the_database(area_id, expected_is_county, mocker):
+    area = broadcast_area_libraries.get_areas([area_id])[0]
+    query_mock = mocker.spy(BroadcastAreasRepository, "query")
+
+    assert any(sub_area.has_sub_areas for sub_area in area.sub_areas) is expected_is_county
+    assert all(sub_area.has_sub_areas == bool(sub_area.sub_areas) for sub_area in area.sub_areas)
+    assert query_mock.call_count == 0
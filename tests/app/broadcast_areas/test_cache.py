@@ -0,0 +1,45 @@
+from collections import namedtuple
+
+from app.broadcast_areas.cache import (
+    APPROXIMATE_SIZE_OF_POINT_IN_BYTES,
+    PolygonsCache,
+)
+
+FakePolygons = namedtuple("FakePolygons", ["name", "point_count"])
+
+
+def test_polygons_cache_only_loads_once(mocker):
+    cache = PolygonsCache(max_size_in_bytes=10 * APPROXIMATE_SIZE_OF_POINT_IN_BYTES)
+    load = mocker.Mock(return_value=FakePolygons("a", 5))
+
+    assert cache.get(("area-a", "polygons"), load) == FakePolygons("a", 5)
+    assert cache.get(("area-a", "polygons"), load) == FakePolygons("a", 5)
+
+    assert load.call_count == 1
+    assert cache.stats == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "items": 1,
+        "size_in_bytes": 5 * APPROXIMATE_SIZE_OF_POINT_IN_BYTES,
+    }
+
+
+def test_polygons_cache_evicts_least_recently_used():
+    cache = PolygonsCache(max_size_in_bytes=10 * APPROXIMATE_SIZE_OF_POINT_IN_BYTES)
+
+    cache.get("a", lambda: FakePolygons("a", 4))
+    cache.get("b", lambda: FakePolygons("b", 4))
+    cache.get("a", lambda: FakePolygons("a", 4))
+    cache.get("c", lambda: FakePolygons("c", 4))
+
+    assert list(cache._items) == ["a", "c"]
+    assert cache.evictions == 1
+    assert cache.size_in_bytes == 8 * APPROXIMATE_SIZE_OF_POINT_IN_BYTES
+
+
+def test_polygons_cache_doesnt_keep_polygons_bigger_than_budget():
+    cache = PolygonsCache(max_size_in_bytes=10 * APPROXIMATE_SIZE_OF_POINT_IN_BYTES)
+
+    assert cache.get("a", lambda: FakePolygons("a", 11)) == FakePolygons("a", 11)
+    assert len(cache) == 0
@@ -0,0 +1,94 @@
+import pytest
+
+from app.broadcast_areas.catalogue import area_catalogue
+from app.broadcast_areas.repo import BroadcastAreasRepository
+
+
+def test_catalogue_has_the_same_libraries_as_the_database():
+    assert area_catalogue.get_libraries() == BroadcastAreasRepository().get_libraries()
+
+
+@pytest.mark.parametrize(
+    "area_ids",
+    (
+        ["ctry19-E92000001", "ctry19-W92000004"],
+        ["wd25-E05009372", "lad25-E09000012"],  # Hackney Central, Hackney
+        ["postcodes-BD1 1EE", "ctry19-E92000001"],
+        ["not-an-area"],
+    ),
+)
+def test_catalogue_gets_the_same_areas_as_the_database(area_ids):
+    assert sorted(area_catalogue.get_areas(area_ids)) == sorted(BroadcastAreasRepository().get_areas(area_ids))
+
+
+@pytest.mark.parametrize(
+    "area_id",
+    (
+        "ctry19-E92000001",
+        "wd25-E05009372",  # Hackney Central
+        "REPPIR_DEPZ_sites-awe_aldermaston",
+        "Flood_Warning_Target_Areas-011FWCN2M",
+    ),
+)
+def test_catalogue_gets_counts_of_phones_as_the_same_type_as_the_database(area_id):
+    ((*_, catalogue_count_of_phones, _library_id),) = area_catalogue.get_areas([area_id])
+    ((*_, database_count_of_phones, _library_id),) = BroadcastAreasRepository().get_areas([area_id])
+
+    assert type(catalogue_count_of_phones) is type(database_count_of_phones)
+    assert catalogue_count_of_phones == database_count_of_phones
+
+
+@pytest.mark.parametrize(
+    "area_id",
+    (
+        "ctyua25-E10000016",  # Kent
+        "lad25-E07000105",  # Ashford
+        "lad25-E06000065",  # North Yorkshire
+        "wd25-E05009372",  # Hackney Central
+    ),
+)
+def test_catalogue_gets_the_same_hierarchy_as_the_database(area_id):
+    repo = BroadcastAreasRepository()
+
+    assert sorted(area_catalogue.get_all_areas_for_group(area_id)) == sorted(repo.get_all_areas_for_group(area_id))
+    assert area_catalogue.get_parent_for_area(area_id) == repo.get_parent_for_area(area_id)
+    assert area_catalogue.get_ancestors_for_areas([area_id]) == repo.get_ancestors_for_areas([area_id])
+
+
+def test_catalogue_gets_local_authorities_without_querying_the_database(mocker):
+    area_catalogue.load()
+    query_mock = mocker.spy(BroadcastAreasRepository, "query")
+
+    local_authorities = area_catalogue.get_all_area_names_and_ids_for_local_authorities()
+
+    assert local_authorities["hackney"] == "lad25-E09000012"
+    assert local_authorities["kent"] == "ctyua25-E10000016"
+    assert query_mock.call_count == 0
+
+
+def test_catalogue_shares_read_only_lookups_between_requests():
+    local_authorities = area_catalogue.get_all_area_names_and_ids_for_local_authorities()
+    flood_warning_area_ids = area_catalogue.get_area_ids_for_library("Flood_Warning_Target_Areas")
+
+    assert area_catalogue.get_all_area_names_and_ids_for_local_authorities() is local_authorities
+    assert area_catalogue.get_area_ids_for_library("Flood_Warning_Target_Areas") is flood_warning_area_ids
+    assert flood_warning_area_ids == {
+        area_id for area_id, *_ in BroadcastAreasRepository().get_all_areas_for_library("Flood_Warning_Target_Areas")
+    }
+
+    with pytest.raises(TypeError):
+        local_authorities["not a local authority"] = "lad25-E09000012"
+    with pytest.raises(AttributeError):
+        flood_warning_area_ids.add("Flood_Warning_Target_Areas-not-an-area")
+
+
+def test_catalogue_summarises_libraries_the_same_as_the_database():
+    repo = BroadcastAreasRepository()
+
+    for library_id, *_ in repo.get_libraries():
+        if library_id == "postcodes":
+            continue
+        areas = repo.get_all_areas_for_library(library_id)
+        summary = area_catalogue.get_library_summary(library_id)
+        assert summary.count_of_areas == len(areas)
+        assert summary.example_names == sorted(name for _id, name, *_ in areas)[:4]
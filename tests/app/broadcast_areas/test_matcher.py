@@ -0,0 +1,50 @@
+import pytest
+
+from app.broadcast_areas.catalogue import area_catalogue
+from app.broadcast_areas.matcher import TrigramMatcher, get_trigrams
+
+
+def test_get_trigrams_ignores_case_and_punctuation():
+    assert get_trigrams("Mid-Sussex") == get_trigrams("mid  sussex") == get_trigrams("MID SUSSEX")
+
+
+@pytest.mark.parametrize(
+    "name, expected_suggestions",
+    (
+        ("Hackny", ["Hackney"]),
+        ("hackney", ["Hackney"]),
+        ("Kingston-upon-Hull", ["Kingston upon Hull, City of"]),
+        ("Brighton", []),
+    ),
+)
+def test_matcher_suggests_similar_names(name, expected_suggestions):
+    matcher = TrigramMatcher(["Hackney", "Kingston upon Hull, City of", "Kent", "Adur", "Arun"])
+
+    assert matcher.suggest(name) == expected_suggestions
+
+
+def test_matcher_suggests_the_most_similar_names_first():
+    matcher = TrigramMatcher(["011FWCN2A", "011FWCN1B", "011FWCN1A", "011FWBWH"])
+
+    assert matcher.suggest("011FWCN1", limit=2) == ["011FWCN1A", "011FWCN1B"]
+
+
+def test_matcher_suggests_for_each_name_once():
+    matcher = TrigramMatcher(["Hackney", "Kent"])
+
+    assert matcher.suggest_for_all(["Hackny", "Knet", "Hackny"]) == {
+        "Hackny": ["Hackney"],
+        "Knet": [],
+    }
+
+
+@pytest.mark.parametrize(
+    "get_matcher, name, expected_suggestion",
+    (
+        (area_catalogue.get_local_authority_matcher, "Hackny", "Hackney"),
+        (area_catalogue.get_local_authority_matcher, "North Yorkshre", "North Yorkshire"),
+        (area_catalogue.get_flood_warning_area_matcher, "011FWBW", "011FWBWH"),
+    ),
+)
+def test_catalogue_matchers_suggest_real_areas(get_matcher, name, expected_suggestion):
+    assert expected_suggestion in get_matcher().suggest(name)
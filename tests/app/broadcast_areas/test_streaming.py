@@ -0,0 +1,69 @@
+import json
+
+import geojson
+import pytest
+
+from app.broadcast_areas import streaming
+from app.broadcast_areas.streaming import iter_features
+
+
+def _feature(id_, number_of_points):
+    return {
+        "type": "Feature",
+        "properties": {"id": id_, "name": f"Área {id_}"},
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[-1.123456789 + index / 1000, 51.987654321] for index in range(number_of_points)]],
+        },
+    }
+
+
+@pytest.mark.parametrize("read_size", (1, 100, 1024 * 1024))
+@pytest.mark.parametrize("indent", (None, 2))
+def test_iter_features_gives_the_same_features_as_geojson_loads(tmp_path, mocker, read_size, indent):
+    mocker.patch.object(streaming, "READ_SIZE", read_size)
+    path = tmp_path / "areas.geojson"
+    path.write_text(
+        json.dumps(
+            {
+                "type": "FeatureCollection",
+                "name": "Areas",
+                "crs": {"type": "name", "properties": {"name": "urn:ogc:def:crs:OGC:1.3:CRS84"}},
+                "features": [_feature(1, 3), _feature(2, 500), _feature(3, 4)],
+                "totalFeatures": 1234567890,
+            },
+            indent=indent,
+            ensure_ascii=False,
+        ),
+        encoding="utf-8",
+    )
+
+    assert list(iter_features(path)) == geojson.loads(path.read_text(encoding="utf-8"))["features"]
+
+
+def test_iter_features_reads_one_feature_at_a_time(tmp_path, mocker):
+    mocker.patch.object(streaming, "READ_SIZE", 100)
+    path = tmp_path / "areas.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [_feature(1, 3), _feature(2, 3)]}))
+
+    features = iter_features(path)
+
+    assert next(features)["properties"]["id"] == 1
+    assert next(features)["properties"]["id"] == 2
+    with pytest.raises(StopIteration):
+        next(features)
+
+
+def test_iter_features_with_no_features(tmp_path):
+    path = tmp_path / "areas.geojson"
+    path.write_text('{"type": "FeatureCollection", "features": []}')
+
+    assert list(iter_features(path)) == []
+
+
+def test_iter_features_raises_for_a_truncated_file(tmp_path):
+    path = tmp_path / "areas.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [_feature(1, 3)]})[:-20])
+
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_features(path))
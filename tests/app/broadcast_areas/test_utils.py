@@ -1,10 +1,15 @@
 import pytest
+from emergency_alerts_utils.polygons import Polygons
+from shapely import Polygon
 
-from app.broadcast_areas.models import BroadcastAreaLibraries
+from app.broadcast_areas.models import BroadcastArea, BroadcastAreaLibraries
 from app.broadcast_areas.utils import (
     aggregate_areas,
+    choose_levels_of_detail,
     create_areas_dict,
+    get_map_polygons_from_areas,
     get_polygons_from_areas,
+    union_polygons,
 )
 from app.models.broadcast_message import BroadcastMessage
 from tests import broadcast_message_json
@@ -245,3 +250,162 @@ def test_create_areas_dict(area_ids, expected_dict):
 def test_get_polygons_from_areas(area_ids, area_attribute, expected_polygons):
     areas = BroadcastAreaLibraries().get_areas(area_ids)
     assert get_polygons_from_areas(areas, area_attribute).as_coordinate_pairs_lat_long == expected_polygons
+
+
+TOLERANCES_IN_M = {
+    0: 0,
+    1: 100,
+    2: 300,
+    3: 1_000,
+}
+
+
+@pytest.mark.parametrize(
+    ("tolerances_in_m", "extent_in_m", "expected_levels"),
+    [
+        # Some of the areas don’t have levels of detail
+        ({}, 10_000, [0]),
+        # Zoomed in too far for any level to look the same
+        (TOLERANCES_IN_M, 10_000, [0]),
+        # A 100m change can’t be seen, and a 300m one is within 3 pixels
+        (TOLERANCES_IN_M, 100 * 600, [1, 2]),
+        # Zoomed out far enough that a 300m change can’t be seen
+        (TOLERANCES_IN_M, 300 * 600, [2]),
+        (TOLERANCES_IN_M, 1_000 * 600, [3]),
+    ],
+)
+def test_choose_levels_of_detail(tolerances_in_m, extent_in_m, expected_levels):
+    assert choose_levels_of_detail(tolerances_in_m, extent_in_m=extent_in_m) == expected_levels
+
+
+def _polygons_with_point_count(point_count):
+    return Polygons(
+        [[[x * 10, x % 2 * 10] for x in range(point_count - 1)] + [[0, 0]]],
+        utm_crs="epsg:32630",
+    )
+
+
+@pytest.mark.parametrize(
+    "point_counts_by_level, expected_point_count",
+    (
+        # The level which looks the same fits in the budget of 500 points
+        ({1: 400, 2: 300}, 400),
+        # The first coarser level whose merged polygons fit
+        ({1: 900, 2: 450}, 450),
+        # Nothing fits, so the level which looks the same
+        ({1: 900, 2: 800}, 900),
+    ),
+)
+def test_get_map_polygons_from_areas_budgets_for_the_merged_polygons(
+    mocker,
+    point_counts_by_level,
+    expected_point_count,
+):
+    mocker.patch("app.broadcast_areas.utils.get_levels_of_detail_to_try", return_value=[1, 2])
+    mocker.patch(
+        "app.broadcast_areas.utils._get_polygons_with_wards_merged",
+        side_effect=lambda areas, level: [_polygons_with_point_count(point_counts_by_level[level])],
+    )
+    areas = BroadcastAreaLibraries().get_areas(["ctry19-E92000001", "ctry19-W92000004"])
+
+    assert get_map_polygons_from_areas(areas).point_count == expected_point_count
+
+
+def test_get_map_polygons_from_areas_draws_one_area_in_full(mocker):
+    get_simplified_polygons = mocker.spy(BroadcastArea, "get_simplified_polygons")
+    (england,) = BroadcastAreaLibraries().get_areas(["ctry19-E92000001"])
+
+    assert get_map_polygons_from_areas([england]).as_coordinate_pairs_lat_long == (
+        england.polygons.as_coordinate_pairs_lat_long
+    )
+    assert not get_simplified_polygons.called
+
+
+def test_union_polygons_merges_neighbouring_areas_in_the_same_crs():
+    def square(x, y, size=1000):
+        return Polygon([(x, y), (x + size, y), (x + size, y + size), (x, y + size)])
+
+    unioned = list(
+        union_polygons(
+            [
+                Polygons([square(0, 0)], utm_crs="epsg:32630"),
+                Polygons([square(1000, 0), square(5000, 0)], utm_crs="epsg:32630"),
+                Polygons([square(0, 0)], utm_crs="epsg:32631"),
+            ]
+        )
+    )
+
+    assert [polygons.utm_crs for polygons in unioned] == ["epsg:32630", "epsg:32631"]
+    assert [sorted(polygon.area for polygon in polygons) for polygons in unioned] == [
+        [1_000_000, 2_000_000],
+        [1_000_000],
+    ]
+
+
+def test_get_polygons_from_areas_doesnt_use_levels_of_detail(mocker):
+    get_simplified_polygons = mocker.spy(BroadcastArea, "get_simplified_polygons")
+    areas = BroadcastAreaLibraries().get_areas(["ctry19-E92000001", "ctry19-W92000004"])
+
+    get_polygons_from_areas(areas, "simple_polygons")
+
+    assert not get_simplified_polygons.called
+
+
+def test_get_map_polygons_from_areas_uses_the_level_of_detail_chosen(mocker):
+    mocker.patch("app.broadcast_areas.utils.get_levels_of_detail_to_try", return_value=[2])
+    get_simplified_polygons = mocker.spy(BroadcastArea, "get_simplified_polygons")
+    areas = BroadcastAreaLibraries().get_areas(["ctry19-E92000001", "ctry19-W92000004"])
+
+    get_map_polygons_from_areas(areas)
+
+    assert [call.args[1:] for call in get_simplified_polygons.call_args_list] == [(2,), (2,)]
+
+
+@pytest.mark.parametrize("number_of_wards_left_out, expected_to_use_outline", ((0, True), (1, False)))
+def test_wards_are_swapped_for_their_outline_only_if_every_ward_is_picked(
+    mocker,
+    number_of_wards_left_out,
+    expected_to_use_outline,
+):
+    mocker.patch("app.broadcast_areas.utils.get_levels_of_detail_to_try", return_value=[2])
+    outline = Polygons([[[0, 0], [1000, 0], [1000, 1000], [0, 1000]]], utm_crs="epsg:32630")
+    get_ward_outline = mocker.patch.object(BroadcastArea, "get_ward_outline", return_value=outline)
+    get_simplified_polygons = mocker.patch.object(BroadcastArea, "get_simplified_polygons", return_value=outline)
+
+    hackney = BroadcastAreaLibraries().get_areas(["lad25-E09000012"])[0]
+    wards = sorted(hackney.sub_areas)[number_of_wards_left_out:]
+
+    get_map_polygons_from_areas(wards)
+
+    if expected_to_use_outline:
+        get_ward_outline.assert_called_once_with(2)
+        assert not get_simplified_polygons.called
+    else:
+        assert not get_ward_outline.called
+        assert {call.args for call in get_simplified_polygons.call_args_list} == {(2,)}
+
+
+@pytest.mark.parametrize("number_of_wards_left_out", (0, 1))
+def test_wards_sent_to_are_never_merged(mocker, number_of_wards_left_out):
+    get_ward_outline = mocker.spy(BroadcastArea, "get_ward_outline")
+
+    hackney = BroadcastAreaLibraries().get_areas(["lad25-E09000012"])[0]
+    wards = sorted(hackney.sub_areas)[number_of_wards_left_out:]
+
+    # The same as combining the simple polygons of each ward and then
+    # simplifying them again, without any ward outline or union
+    expected_polygons = Polygons(
+        [polygon for ward in wards for polygon in ward.simple_polygons],
+        utm_crs=wards[0].simple_polygons.utm_crs,
+    ).smooth.simplify
+
+    assert create_areas_dict(wards)["simple_polygons"] == expected_polygons.as_coordinate_pairs_lat_long
+    assert not get_ward_outline.called
+
+
+def test_union_polygons_keeps_holes():
+    outside = Polygon([(0, 0), (3000, 0), (3000, 3000), (0, 3000)], [[(1000, 1000), (2000, 1000), (2000, 2000)]])
+
+    (unioned,) = union_polygons([Polygons([outside], utm_crs="epsg:32630")])
+
+    assert [polygon.area for polygon in unioned] == [outside.area]
@@ -1,5 +1,6 @@
 import pytest
 
+from app.broadcast_areas.matcher import TrigramMatcher
 from app.main.forms import FloodWarningBulkAreasForm, LocalAuthorityBulkAreasForm
 
 library_ids = [
@@ -97,3 +98,30 @@ def test_too_many_areas_input_for_local_authority_areas_form():
     assert not form.validate()
     assert form.areas.errors == ["Maximum of 25 areas in an emergency alert"]
     assert form.form_errors == ["Maximum of 25 local authorities allowed as a list in one emergency alert"]
+
+
+def test_local_authority_areas_form_suggests_what_was_meant():
+    form = LocalAuthorityBulkAreasForm(
+        library_ids=library_areas_lookup_dict,
+        matcher=TrigramMatcher(["Adur", "Arun", "Chichester", "Mid Sussex"]),
+        areas="Chichster\nMid-Sussex\nAdur\nBrighton",
+    )
+    assert not form.validate()
+    assert form.areas.errors == [
+        "Local authority 'Chichster' not found. Did you mean Chichester?",
+        "Local authority 'Mid-Sussex' not found. Did you mean Mid Sussex?",
+        "Local authority 'Brighton' not found",
+    ]
+    assert form.form_errors == ["Local authority not found"]
+
+
+def test_flood_warning_areas_form_suggests_what_was_meant():
+    form = FloodWarningBulkAreasForm(
+        library_ids=library_ids,
+        matcher=TrigramMatcher(["011FWBWH", "011FWCN1A", "011FWCN1B", "011FWCN2A"]),
+        areas="011FWCN1",
+    )
+    assert not form.validate()
+    assert form.areas.errors == [
+        "Flood Warning TA code '011FWCN1' not found. Did you mean 011FWCN1A, 011FWCN1B or 011FWCN2A?",
+    ]
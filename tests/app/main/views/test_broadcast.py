@@ -8,7 +8,7 @@ import pytest
 from flask import url_for
 from freezegun import freeze_time
 
-from app.broadcast_areas.models import BroadcastAreaLibraries
+from app.broadcast_areas.models import BroadcastAreaLibraries, BroadcastAreaLibrary
 from tests import (
     NotifyBeautifulSoup,
     broadcast_message_json,
@@ -2016,6 +2016,183 @@ def test_choose_area_page(
     ]
 
 
+def test_choose_area_page_lists_big_libraries_a_page_at_a_time(
+    client_request,
+    service_one,
+    mock_get_draft_broadcast_message,
+    fake_uuid,
+    active_user_create_broadcasts_permission,
+    mocker,
+):
+    mocker.patch.object(BroadcastAreaLibrary, "areas_per_page", 3)
+    service_one["permissions"] += ["broadcast"]
+    client_request.login(active_user_create_broadcasts_permission)
+
+    first_page = client_request.get(
+        ".choose_area",
+        service_id=SERVICE_ONE_ID,
+        message_id=fake_uuid,
+        message_type="broadcast",
+        library_slug="ctry19",
+    )
+    last_page = client_request.get(
+        ".choose_area",
+        service_id=SERVICE_ONE_ID,
+        message_id=fake_uuid,
+        message_type="broadcast",
+        library_slug="ctry19",
+        page=2,
+    )
+
+    assert [choice["value"] for choice in first_page.select("input[name=areas]")] == [
+        "ctry19-E92000001",
+        "ctry19-N92000002",
+        "ctry19-S92000003",
+    ]
+    assert [choice["value"] for choice in last_page.select("input[name=areas]")] == ["ctry19-W92000004"]
+    assert first_page.select_one("button[name=go_to_page]")["formaction"] == url_for(
+        "main.choose_area",
+        service_id=SERVICE_ONE_ID,
+        message_id=fake_uuid,
+        message_type="broadcast",
+        library_slug="ctry19",
+        page=2,
+    )
+    assert normalize_spaces(last_page.select_one("button[name=go_to_page]").text) == "Previous page, page 1 of 2"
+
+
+def test_choose_area_page_lists_flood_warning_areas_a_page_at_a_time(
+    client_request,
+    service_one,
+    mock_get_draft_broadcast_message,
+    fake_uuid,
+    active_user_create_broadcasts_permission,
+):
+    service_one["permissions"] += ["broadcast"]
+    client_request.login(active_user_create_broadcasts_permission)
+
+    page = client_request.get(
+        ".choose_area",
+        service_id=SERVICE_ONE_ID,
+        message_id=fake_uuid,
+        message_type="broadcast",
+        library_slug="Flood_Warning_Target_Areas",
+    )
+
+    assert len(page.select("input[name=areas]")) == BroadcastAreaLibrary.areas_per_page == 100
+    assert page.select_one("button[name=go_to_page]")["formaction"] == url_for(
+        "main.choose_area",
+        service_id=SERVICE_ONE_ID,
+        message_id=fake_uuid,
+        message_type="broadcast",
+        library_slug="Flood_Warning_Target_Areas",
+        page=2,
+    )
+
+
+@pytest.mark.parametrize(
+    "library_slug, areas_per_page, expected_search_url",
+    (
+        ("ctry19", 100, None),
+        (
+            "ctry19",
+            3,
+            partial(
+                url_for,
+                "main.search_library_areas",
+                service_id=SERVICE_ONE_ID,
+                message_type="broadcast",
+                library_slug="ctry19",
+            ),
+        ),
+        (
+            "wd25-lad25-ctyua25",
+            3,
+            partial(
+                url_for,
+                "main.search_library_areas",
+                service_id=SERVICE_ONE_ID,
+                message_type="broadcast",
+                library_slug="wd25-lad25-ctyua25",
+                with_sub_areas_only="1",
+            ),
+        ),
+    ),
+)
+def test_choose_area_page_searches_the_whole_of_big_libraries(
+    client_request,
+    service_one,
+    mock_get_draft_broadcast_message,
+    fake_uuid,
+    active_user_create_broadcasts_permission,
+    mocker,
+    library_slug,
+    areas_per_page,
+    expected_search_url,
+):
+    mocker.patch.object(BroadcastAreaLibrary, "areas_per_page", areas_per_page)
+    service_one["permissions"] += ["broadcast"]
+    client_request.login(active_user_create_broadcasts_permission)
+
+    page = client_request.get(
+        ".choose_area",
+        service_id=SERVICE_ONE_ID,
+        message_id=fake_uuid,
+        message_type="broadcast",
+        library_slug=library_slug,
+    )
+
+    live_search = page.select_one("[data-notify-module=live-search]")
+
+    if expected_search_url:
+        assert live_search["data-search-url"] == expected_search_url()
+        assert page.select_one("template.live-search__result")
+    else:
+        assert not live_search.has_attr("data-search-url")
+        assert not page.select_one("template.live-search__result")
+
+
+def test_choose_area_page_keeps_areas_chosen_on_other_pages(
+    client_request,
+    service_one,
+    mock_get_draft_broadcast_message,
+    fake_uuid,
+    active_user_create_broadcasts_permission,
+    mocker,
+):
+    mocker.patch.object(BroadcastAreaLibrary, "areas_per_page", 3)
+    mock_replace_areas = mocker.patch("app.models.broadcast_message.BroadcastMessage.replace_areas")
+    service_one["permissions"] += ["broadcast"]
+    client_request.login(active_user_create_broadcasts_permission)
+
+    last_page = client_request.post(
+        ".choose_area",
+        service_id=SERVICE_ONE_ID,
+        message_id=fake_uuid,
+        message_type="broadcast",
+        library_slug="ctry19",
+        page=2,
+        _data={"areas": ["ctry19-E92000001"], "go_to_page": "2"},
+        _expected_status=200,
+    )
+
+    assert [hidden["value"] for hidden in last_page.select("input[name=selected_areas]")] == ["ctry19-E92000001"]
+    assert not mock_replace_areas.called
+
+    client_request.post(
+        ".choose_area",
+        service_id=SERVICE_ONE_ID,
+        message_id=fake_uuid,
+        message_type="broadcast",
+        library_slug="ctry19",
+        page=2,
+        _data={"selected_areas": ["ctry19-E92000001", "not-an-area"], "areas": ["ctry19-W92000004"]},
+        _expected_status=302,
+    )
+
+    mock_replace_areas.assert_called_once_with(["ctry19-E92000001", "ctry19-W92000004"])
+
+
 def test_choose_area_page_for_area_with_sub_areas(
     client_request,
     service_one,
@@ -2087,6 +2264,79 @@ def test_choose_area_page_for_area_with_sub_areas(
     )
 
 
+@pytest.mark.parametrize(
+    "library_slug, search_term, expected_first_result",
+    (
+        ("ctry19", "eng", {"id": "ctry19-E92000001", "name": "England", "parent": None}),
+        (
+            "wd25-lad25-ctyua25",
+            "hackney cent",
+            {"id": "wd25-E05009372", "name": "Hackney Central", "parent": "Hackney"},
+        ),
+    ),
+)
+def test_search_library_areas(
+    client_request,
+    service_one,
+    active_user_create_broadcasts_permission,
+    library_slug,
+    search_term,
+    expected_first_result,
+):
+    service_one["permissions"] += ["broadcast"]
+    client_request.login(active_user_create_broadcasts_permission)
+
+    response = client_request.get_response(
+        ".search_library_areas",
+        service_id=SERVICE_ONE_ID,
+        message_type="broadcast",
+        library_slug=library_slug,
+        q=search_term,
+    )
+
+    assert json.loads(response.get_data(as_text=True))["areas"][0] == expected_first_result
+
+
+def test_search_library_areas_with_sub_areas_only(
+    client_request,
+    service_one,
+    active_user_create_broadcasts_permission,
+):
+    service_one["permissions"] += ["broadcast"]
+    client_request.login(active_user_create_broadcasts_permission)
+
+    response = client_request.get_response(
+        ".search_library_areas",
+        service_id=SERVICE_ONE_ID,
+        message_type="broadcast",
+        library_slug="wd25-lad25-ctyua25",
+        q="hackney",
+        with_sub_areas_only="1",
+    )
+
+    assert json.loads(response.get_data(as_text=True))["areas"] == [
+        {"id": "lad25-E09000012", "name": "Hackney", "parent": None},
+    ]
+
+
+def test_search_library_areas_404s_for_unknown_library(
+    client_request,
+    service_one,
+    active_user_create_broadcasts_permission,
+):
+    service_one["permissions"] += ["broadcast"]
+    client_request.login(active_user_create_broadcasts_permission)
+
+    client_request.get_response(
+        ".search_library_areas",
+        service_id=SERVICE_ONE_ID,
+        message_type="broadcast",
+        library_slug="not-a-library",
+        q="anything",
+        _expected_status=404,
+    )
+
+
 def test_choose_sub_area_page_for_district_shows_checkboxes_for_wards(
     client_request,
     service_one,
@@ -4,6 +4,7 @@ from unittest.mock import patch
 import pytest
 from shapely import Point
 
+from app.broadcast_areas.repo import BroadcastAreasRepository
 from app.main.forms import (
     EastingNorthingCoordinatesForm,
     LatitudeLongitudeCoordinatesForm,
@@ -216,6 +217,17 @@ def test_get_centroid_if_postcode_in_db(postcode, expected_centroid):
         assert centroid.y == expected_centroid[1]
 
 
+def test_get_centroid_if_postcode_in_db_doesnt_load_polygons(mocker):
+    get_areas_mock = mocker.spy(BroadcastAreasRepository, "get_areas")
+    get_polygons_mock = mocker.spy(BroadcastAreasRepository, "get_polygons_for_area")
+
+    centroid = get_centroid_if_postcode_in_db("postcodes-BD1 1EE", PostcodeForm())
+
+    assert centroid == get_centroid(BroadcastMessage.libraries.get_areas(["postcodes-BD1 1EE"])[0])
+    assert get_areas_mock.call_count == 1
+    assert get_polygons_mock.call_count == 0
+
+
 @pytest.mark.parametrize(
     "area_name, expected_output",
     [
@@ -721,4 +721,125 @@ describe('Live search', () => {
 
   });
 
+
+  describe("With a library searched on the server", () => {
+
+    let searchResponse;
+
+    beforeEach(() => {
+
+      searchResponse = { areas: [] };
+
+      // mock the bits of jQuery used
+      jest.spyOn(window.$, 'ajax').mockImplementation(() => ({
+        done: callback => callback(searchResponse)
+      }));
+
+      document.body.innerHTML = `
+        <div class="live-search js-header" data-notify-module="live-search" data-targets=".govuk-checkboxes__item" data-search-url="/search.json">
+          <div class="govuk-form-group">
+            <label class="govuk-label" for="search">
+              Search and filter by name
+            </label>
+            <input class="govuk-input govuk-!-width-full" id="search" name="search" type="search" autocomplete="off">
+          </div>
+          <div aria-live="polite" class="live-search__status govuk-visually-hidden"></div>
+        </div>
+        <form method="post" autocomplete="off" novalidate>
+          <ul class="govuk-checkboxes">
+            <li class="govuk-checkboxes__item">
+              <input class="govuk-checkboxes__input" id="areas-0" name="areas" type="checkbox" value="area-1">
+              <label class="govuk-label govuk-checkboxes__label" for="areas-0">Abbey</label>
+            </li>
+            <li class="govuk-checkboxes__item">
+              <input class="govuk-checkboxes__input" id="areas-1" name="areas" type="checkbox" value="area-2">
+              <label class="govuk-label govuk-checkboxes__label" for="areas-1">Barnet</label>
+            </li>
+          </ul>
+          <template class="live-search__result">
+            <li class="govuk-checkboxes__item">
+              <input class="govuk-checkboxes__input" type="checkbox" name="selected_areas">
+              <label class="govuk-label govuk-checkboxes__label live-search__result-name"></label>
+            </li>
+          </template>
+        </form>`;
+
+      searchTextbox = document.getElementById('search');
+      liveRegion = document.querySelector('.live-search__status');
+      list = document.querySelector('form');
+
+    });
+
+    afterEach(() => {
+      $.ajax.mockRestore();
+    });
+
+    test("If there is no search term, the server should not be asked", () => {
+
+      // start the module
+      window.GOVUK.notifyModules.start();
+
+      const listItems = list.querySelectorAll('.govuk-checkboxes__item');
+      const listItemsShowing = Array.from(listItems).filter(item => window.getComputedStyle(item).display !== 'none');
+
+      expect(listItemsShowing.length).toEqual(2);
+      expect($.ajax).not.toHaveBeenCalled();
+
+    });
+
+    test("Areas from other pages should be added to the ones on this page", () => {
+
+      // start the module
+      window.GOVUK.notifyModules.start();
+
+      searchResponse = {
+        areas: [
+          { id: 'area-2', name: 'Barnet', parent: null },
+          { id: 'area-3', name: 'Barnsley', parent: null }
+        ]
+      };
+
+      // simulate the input of new search text
+      searchTextbox.value = 'Barn';
+      helpers.triggerEvent(searchTextbox, 'input');
+
+      expect($.ajax.mock.calls[0][0]).toEqual('/search.json');
+      expect($.ajax.mock.calls[0][1].data).toEqual({ q: 'Barn' });
+
+      const listItems = list.querySelectorAll('.govuk-checkboxes__item');
+      const listItemsShowing = Array.from(listItems).filter(item => window.getComputedStyle(item).display !== 'none');
+
+      expect(listItemsShowing.map(item => item.textContent.trim())).toEqual(['Barnet', 'Barnsley']);
+      expect(listItemsShowing[1].querySelector('input').name).toEqual('selected_areas');
+      expect(listItemsShowing[1].querySelector('input').value).toEqual('area-3');
+      expect(liveRegion.textContent.trim()).toEqual(liveRegionResults(2));
+
+    });
+
+    test("Areas from other pages should stay if they have been checked", () => {
+
+      // start the module
+      window.GOVUK.notifyModules.start();
+
+      searchResponse = { areas: [{ id: 'area-3', name: 'Barnsley', parent: null }] };
+
+      searchTextbox.value = 'Barns';
+      helpers.triggerEvent(searchTextbox, 'input');
+
+      list.querySelector('input[value=area-3]').checked = true;
+
+      searchResponse = { areas: [{ id: 'area-4', name: 'Croydon', parent: null }] };
+
+      searchTextbox.value = 'Croy';
+      helpers.triggerEvent(searchTextbox, 'input');
+
+      const listItems = list.querySelectorAll('.govuk-checkboxes__item');
+      const listItemsShowing = Array.from(listItems).filter(item => window.getComputedStyle(item).display !== 'none');
+
+      expect(listItemsShowing.map(item => item.textContent.trim())).toEqual(['Barnsley', 'Croydon']);
+
+    });
+
+  });
+
 });